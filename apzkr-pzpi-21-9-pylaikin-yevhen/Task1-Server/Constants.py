@@ -7,3 +7,40 @@ PG_DB: str = os.getenv("PG_DB", "coursedb")
 JWT_SECRET_KEY: str = os.getenv("JWT_SECRET_KEY")
 JWT_ALGORITHM: str = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
+DEVICE_ID_CACHE_SIZE: int = int(os.getenv("DEVICE_ID_CACHE_SIZE", 10000))
+DEVICE_CONFIG_CACHE_SIZE: int = int(os.getenv("DEVICE_CONFIG_CACHE_SIZE", 10000))
+DEVICE_CONFIG_DEDUPLICATE: bool = os.getenv("DEVICE_CONFIG_DEDUPLICATE", "0") == "1"
+PREDICT_BATCH_MAX_READINGS: int = int(os.getenv("PREDICT_BATCH_MAX_READINGS", 10000))
+RESCORE_CHUNK_SIZE: int = int(os.getenv("RESCORE_CHUNK_SIZE", 5000))
+STATS_PROCESS_WORKERS: int = int(os.getenv("STATS_PROCESS_WORKERS", 0))
+# Точна статистика для діапазонів з більшою оцінкою кількості вимірювань рахується агрегатами в Postgres
+STATS_PUSHDOWN_ROWS: int = int(os.getenv("STATS_PUSHDOWN_ROWS", 200000))
+STATS_CACHE_SIZE: int = int(os.getenv("STATS_CACHE_SIZE", 256))
+STATS_CACHE_OPEN_TTL_SECONDS: int = int(os.getenv("STATS_CACHE_OPEN_TTL_SECONDS", 10))
+# Найбільша кількість сирих вимірювань пристрою, що читається в пам'ять для LTTB-проріджування
+TIMESERIES_LTTB_MAX_ROWS: int = int(os.getenv("TIMESERIES_LTTB_MAX_ROWS", 100000))
+EXPORT_CHUNK_SIZE: int = int(os.getenv("EXPORT_CHUNK_SIZE", 5000))
+MEASUREMENT_PARTITIONING: bool = os.getenv("MEASUREMENT_PARTITIONING", "0") == "1"
+MEASUREMENT_PARTITION_MIGRATE: bool = os.getenv("MEASUREMENT_PARTITION_MIGRATE", "0") == "1"
+MEASUREMENT_PARTITIONS_AHEAD: int = int(os.getenv("MEASUREMENT_PARTITIONS_AHEAD", 2))
+MEASUREMENT_RETENTION_MONTHS: int = int(os.getenv("MEASUREMENT_RETENTION_MONTHS", 0))
+MEASUREMENT_RETENTION_MODE: str = os.getenv("MEASUREMENT_RETENTION_MODE", "downsample")
+PARTITION_MAINTENANCE_INTERVAL: int = int(os.getenv("PARTITION_MAINTENANCE_INTERVAL", 3600))
+INGEST_WRITE_BEHIND: bool = os.getenv("INGEST_WRITE_BEHIND", "0") == "1"
+INGEST_DURABILITY: str = os.getenv("INGEST_DURABILITY", "memory")
+INGEST_SYNCHRONOUS_COMMIT: bool = os.getenv("INGEST_SYNCHRONOUS_COMMIT", "1") == "1"
+INGEST_QUEUE_SIZE: int = int(os.getenv("INGEST_QUEUE_SIZE", 10000))
+INGEST_FLUSH_ROWS: int = int(os.getenv("INGEST_FLUSH_ROWS", 500))
+INGEST_FLUSH_INTERVAL_MS: int = int(os.getenv("INGEST_FLUSH_INTERVAL_MS", 200))
+INGEST_ENQUEUE_TIMEOUT_MS: int = int(os.getenv("INGEST_ENQUEUE_TIMEOUT_MS", 1000))
+INGEST_FLUSH_RETRIES: int = int(os.getenv("INGEST_FLUSH_RETRIES", 3))
+INGEST_DRAIN_TIMEOUT: int = int(os.getenv("INGEST_DRAIN_TIMEOUT", 30))
+LIVE_SUBSCRIBER_BUFFER: int = int(os.getenv("LIVE_SUBSCRIBER_BUFFER", 100))
+LIVE_HEARTBEAT_SECONDS: int = int(os.getenv("LIVE_HEARTBEAT_SECONDS", 15))
+AUTH_CACHE_SIZE: int = int(os.getenv("AUTH_CACHE_SIZE", 10000))
+AUTH_CACHE_TTL_SECONDS: int = int(os.getenv("AUTH_CACHE_TTL_SECONDS", 30))
+ARGON2_TIME_COST: int = int(os.getenv("ARGON2_TIME_COST", 2))
+ARGON2_MEMORY_COST: int = int(os.getenv("ARGON2_MEMORY_COST", 19456))
+ARGON2_PARALLELISM: int = int(os.getenv("ARGON2_PARALLELISM", 1))
+PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 64))
@@ -1,33 +1,89 @@
-from fastapi import Depends, HTTPException, status
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-from typing import Optional
+import time
+from typing import Optional, Tuple
 from passlib.context import CryptContext
 
+from cache import LRUCache, VersionedCache
 from models.user import User
 from get_db import get_db
-from Constants import JWT_SECRET_KEY, JWT_ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from Constants import JWT_SECRET_KEY, JWT_ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, AUTH_CACHE_SIZE, \
+    AUTH_CACHE_TTL_SECONDS, ARGON2_TIME_COST, ARGON2_MEMORY_COST, ARGON2_PARALLELISM, PASSWORD_HASH_WORKERS, \
+    PASSWORD_HASH_MAX_PENDING
 from logger import logger
+from sсhemas.user import UserRead
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+# EventSource і WebSocket у браузері не передають заголовок Authorization, тому токен можна передати в запиті
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
+
+# Нові паролі хешуються argon2; bcrypt-хеші перевіряються й замінюються при наступному вході
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__time_cost=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=ARGON2_PARALLELISM
+)
+
+# Хешування навмисно повільне, тому має власний пул потоків і не займає пул обробників запитів
+_password_executor: Optional[ThreadPoolExecutor] = None
+_password_slots = asyncio.Semaphore(PASSWORD_HASH_MAX_PENDING)
+
+# JWT -> (ім'я користувача, час закінчення дії токена)
+token_cache = LRUCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL_SECONDS)
+# ім'я користувача -> UserRead; інвалідується при блокуванні, зміні ролі та пароля
+principal_cache = VersionedCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL_SECONDS)
+
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def get_password_executor() -> ThreadPoolExecutor:
+    global _password_executor
+    if _password_executor is None:
+        _password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS,
+                                                thread_name_prefix="password-hash")
+    return _password_executor
 
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def run_password_task(func, *args):
+    # Семафор обмежує кількість операцій у черзі пулу під час сплеску входів
+    async with _password_slots:
+        return await asyncio.get_running_loop().run_in_executor(get_password_executor(), func, *args)
 
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def hash_password(password: str) -> str:
+    return await run_password_task(pwd_context.hash, password)
 
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = db.query(User).filter(User.username == username).first()
-    if not user or not verify_password(password, user.password_hash):
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    # Другий елемент - новий хеш, якщо старий створено застарілою схемою або з іншими параметрами
+    return await run_password_task(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+def shutdown_password_executor() -> None:
+    global _password_executor
+    if _password_executor is not None:
+        _password_executor.shutdown(wait=True, cancel_futures=True)
+        _password_executor = None
+
+
+async def authenticate_user_async(db: AsyncSession, username: str, password: str):
+    user = (await db.execute(select(User).where(User.username == username))).scalar_one_or_none()
+    if not user:
         return False
+    valid, new_hash = await verify_and_update_password(password, user.password_hash)
+    if not valid:
+        return False
+    if new_hash:
+        user.password_hash = new_hash
+        await db.commit()
     return user
 
 
@@ -42,40 +98,56 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def login_for_access_token(db: Session, username: str, password: str):
-    user = authenticate_user(db, username, password)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Неправильне ім'я користувача або пароль",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    return get_user_by_token(db, token)
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def get_user_by_token(db: Session, token: Optional[str]) -> UserRead:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Необхідна авторизація",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
+    if not token:
         raise credentials_exception
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
+    username = decode_token_username(token)
+    if username is None:
         raise credentials_exception
+
+    user = principal_cache.get(username)
+    if user is None:
+        version = principal_cache.version(username)
+        db_user = db.query(User).filter(User.username == username).first()
+        if db_user is None:
+            raise credentials_exception
+        user = UserRead.from_orm(db_user)
+        principal_cache.set_if_current(username, user, version)
     return user
 
 
+def decode_token_username(token: str) -> Optional[str]:
+    cached = token_cache.get(token)
+    if cached is not None:
+        username, expires_at = cached
+        # Кеш не продовжує життя токена
+        if expires_at is None or expires_at > time.time():
+            return username
+        token_cache.pop(token)
+        return None
+    try:
+        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+    except JWTError:
+        return None
+    username = payload.get("sub")
+    if username is not None:
+        token_cache.set(token, (username, payload.get("exp")))
+    return username
+
+
+def invalidate_user(username: str) -> None:
+    principal_cache.invalidate(username)
+
+
 async def get_current_active_user(current_user: User = Depends(get_current_user)):
     if current_user.is_banned:
         raise HTTPException(status_code=400, detail="Користувач заблокований")
@@ -98,3 +170,21 @@ def get_current_manager_or_admin(current_user: User = Depends(get_current_active
             detail="Тільки адмін та менеджер можуть виконати цю дію"
         )
     return current_user
+
+
+def authorize_manager_or_admin(db: Session, token: Optional[str]) -> User:
+    user = get_user_by_token(db, token)
+    if user.is_banned:
+        raise HTTPException(status_code=400, detail="Користувач заблокований")
+    if user.role not in ["admin", "manager"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Тільки адмін та менеджер можуть виконати цю дію"
+        )
+    return user
+
+
+def get_live_viewer(header_token: Optional[str] = Depends(oauth2_scheme_optional),
+                    token: Optional[str] = Query(None, description="JWT для EventSource"),
+                    db: Session = Depends(get_db)):
+    return authorize_manager_or_admin(db, header_token or token)
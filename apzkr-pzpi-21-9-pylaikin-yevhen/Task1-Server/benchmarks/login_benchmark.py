@@ -0,0 +1,71 @@
+# Навантажувальний бенчмарк входу: кількість успішних входів за секунду (загалом і на ядро) та затримки
+# при паралельних запитах. Потрібен запущений сервер. Запуск з каталогу Task1-Server:
+# python -m benchmarks.login_benchmark [--url URL] [--requests N] [--concurrency C] [--cores K]
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+import httpx
+
+from Constants import PASSWORD_HASH_WORKERS
+
+# Порт, який відкриває Dockerfile / docker-compose.yml
+DEFAULT_URL = "http://localhost:5000/api/auth"
+
+
+async def login_worker(client: httpx.AsyncClient, url: str, form: dict, remaining: List[int],
+                       latencies: List[float], failures: List[int]) -> None:
+    while remaining[0] > 0:
+        remaining[0] -= 1
+        started = time.perf_counter()
+        response = await client.post(f"{url}/login", data=form)
+        latencies.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            failures[0] += 1
+
+
+async def run(args: argparse.Namespace) -> None:
+    form = {"username": args.username, "password": args.password}
+    async with httpx.AsyncClient(timeout=args.timeout) as client:
+        # Реєстрація повертає 400, якщо користувач уже існує - тоді просто входимо під ним
+        await client.post(f"{args.url}/register", json={**form, "role": "manager"})
+        response = await client.post(f"{args.url}/login", data=form)
+        if response.status_code != 200:
+            raise SystemExit(f"Не вдалося увійти як {args.username}: {response.status_code} {response.text}")
+
+        latencies: List[float] = []
+        failures = [0]
+        remaining = [args.requests]
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            login_worker(client, args.url, form, remaining, latencies, failures) for _ in range(args.concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    succeeded = len(latencies) - failures[0]
+    print(f"запитів: {len(latencies)}, помилок: {failures[0]}, паралельно: {args.concurrency}")
+    print(f"входів за секунду: {succeeded / elapsed:.1f} ({elapsed:.2f} с), "
+          f"на ядро: {succeeded / elapsed / args.cores:.1f} (ядер: {args.cores})")
+    print(f"затримка p50: {statistics.median(latencies) * 1000:.1f} мс, "
+          f"p99: {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} мс, "
+          f"max: {latencies[-1] * 1000:.1f} мс")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--username", default="login_benchmark")
+    parser.add_argument("--password", default="Benchmark-Passw0rd!")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=60)
+    # Хешування паролів займає PASSWORD_HASH_WORKERS потоків сервера (за замовчуванням - кількість ядер)
+    parser.add_argument("--cores", type=int, default=PASSWORD_HASH_WORKERS)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
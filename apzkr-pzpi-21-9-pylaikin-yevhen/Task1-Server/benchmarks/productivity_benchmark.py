@@ -0,0 +1,49 @@
+# Мікробенчмарк оцінки продуктивності: векторне ядро проти скалярного циклу.
+# Запуск з каталогу Task1-Server: python -m benchmarks.productivity_benchmark [--size N] [--repeat R]
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from services.analytics_service import calculate_productivity, calculate_productivity_vectorized
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "set_config.json")
+
+
+def best_of(repeat: int, run) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-scalar", action="store_true")
+    args = parser.parse_args()
+
+    with open(CONFIG_PATH) as config_file:
+        config = json.load(config_file)
+    rng = np.random.default_rng(0)
+    temperature = rng.uniform(10, 35, args.size)
+    humidity = rng.uniform(20, 80, args.size)
+    co2 = rng.uniform(300, 1500, args.size)
+
+    vectorized = best_of(args.repeat, lambda: calculate_productivity_vectorized(temperature, humidity, co2, config))
+    print(f"векторне ядро: {vectorized:.3f} с, {args.size / vectorized:,.0f} вимірювань/с")
+
+    if not args.skip_scalar:
+        values = list(zip(temperature.tolist(), humidity.tolist(), co2.tolist()))
+        scalar = best_of(1, lambda: [calculate_productivity(t, h, c, config) for t, h, c in values])
+        print(f"скалярний цикл: {scalar:.3f} с, {args.size / scalar:,.0f} вимірювань/с")
+        print(f"прискорення: {scalar / vectorized:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
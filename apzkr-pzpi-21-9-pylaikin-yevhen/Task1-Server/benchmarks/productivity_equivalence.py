@@ -0,0 +1,99 @@
+# Перевірка, що calculate_productivity_vectorized дає ті самі цілі значення, що й calculate_productivity.
+# Запуск з каталогу Task1-Server: python -m benchmarks.productivity_equivalence [--size N]
+import argparse
+import json
+import math
+import os
+import sys
+
+import numpy as np
+
+from services.analytics_service import calculate_productivity, calculate_productivity_vectorized
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "set_config.json")
+
+
+def random_inputs(rng: np.random.Generator, size: int):
+    return (rng.uniform(-10, 50, size), rng.uniform(0, 100, size), rng.uniform(200, 3000, size))
+
+
+def integer_inputs(rng: np.random.Generator, size: int):
+    return (rng.integers(-10, 50, size).astype(np.float64), rng.integers(0, 100, size).astype(np.float64),
+            rng.integers(200, 3000, size).astype(np.float64))
+
+
+def boundary_inputs(config, rng: np.random.Generator, lines: int = 40):
+    # Вздовж температури при фіксованих вологості й CO2 шукаємо бісекцією сусідні float, між якими
+    # округлений результат змінюється: це входи, для яких оцінка найближча до межі .5
+    temperature, humidity, co2 = [], [], []
+    low, high = config['min_values']['Temperature'], config['max_values']['Temperature']
+    for _ in range(lines):
+        h = float(rng.uniform(config['min_values']['Humidity'], config['max_values']['Humidity']))
+        c = float(rng.uniform(config['min_values']['CO2'], config['max_values']['CO2']))
+        grid = np.linspace(low, high, 400)
+        scores = [calculate_productivity(float(t), h, c, config) for t in grid]
+        for i in range(len(grid) - 1):
+            if scores[i] == scores[i + 1]:
+                continue
+            left, right = float(grid[i]), float(grid[i + 1])
+            while math.nextafter(left, right) != right:
+                middle = (left + right) / 2
+                if middle in (left, right):
+                    break
+                if calculate_productivity(middle, h, c, config) == scores[i]:
+                    left = middle
+                else:
+                    right = middle
+            for t in (math.nextafter(left, -math.inf), left, right, math.nextafter(right, math.inf)):
+                temperature.append(t)
+                humidity.append(h)
+                co2.append(c)
+    return np.array(temperature), np.array(humidity), np.array(co2)
+
+
+def compare(name: str, config, temperature, humidity, co2) -> int:
+    vectorized = calculate_productivity_vectorized(temperature, humidity, co2, config)
+    mismatches = 0
+    for i in range(len(temperature)):
+        expected = calculate_productivity(float(temperature[i]), float(humidity[i]), float(co2[i]), config)
+        if vectorized[i] != expected:
+            mismatches += 1
+            if mismatches <= 10:
+                print(f"  {name}: ({temperature[i]!r}, {humidity[i]!r}, {co2[i]!r}) -> "
+                      f"{vectorized[i]} замість {expected}")
+    print(f"{name}: {len(temperature)} вимірювань, розбіжностей: {mismatches}")
+    return mismatches
+
+
+def check_non_finite(config) -> int:
+    failures = 0
+    for values in ((math.nan, 50.0, 600.0), (22.0, math.inf, 600.0), (22.0, 50.0, -math.inf)):
+        try:
+            calculate_productivity_vectorized(*([value] for value in values), config)
+            print(f"  {values}: очікувалась ValueError")
+            failures += 1
+        except ValueError:
+            pass
+    print(f"нескінченні значення: помилок перевірки {failures}")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(CONFIG_PATH) as config_file:
+        config = json.load(config_file)
+    rng = np.random.default_rng(args.seed)
+
+    failures = compare("випадкові", config, *random_inputs(rng, args.size))
+    failures += compare("цілі", config, *integer_inputs(rng, args.size))
+    failures += compare("межі округлення", config, *boundary_inputs(config, rng))
+    failures += check_non_finite(config)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class LRUCache:
+    # ttl у секундах обмежує час життя запису; None - записи витісняються лише за розміром
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._expires: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key in self._expires and self._expires[key] <= time.monotonic():
+                self._remove(key)
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            return self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0
+        }
+
+    def _store(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        ttl = self.ttl if ttl is None else ttl
+        if ttl is not None:
+            self._expires[key] = time.monotonic() + ttl
+        else:
+            self._expires.pop(key, None)
+        while len(self._data) > self.maxsize:
+            evicted, _ = self._data.popitem(last=False)
+            self._expires.pop(evicted, None)
+
+    def _remove(self, key: Hashable) -> Optional[Any]:
+        self._expires.pop(key, None)
+        return self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class VersionedCache(LRUCache):
+    # Версія ключа зростає при кожній інвалідації, тому значення, прочитане з БД
+    # до запису, не потрапить у кеш після нього
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        super().__init__(maxsize, ttl)
+        self._epoch = 0
+        self._versions: Dict[Hashable, int] = {}
+
+    def version(self, key: Hashable) -> Tuple[int, int]:
+        with self._lock:
+            return self._epoch, self._versions.get(key, 0)
+
+    def set_if_current(self, key: Hashable, value: Any, version: Tuple[int, int],
+                       ttl: Optional[float] = None) -> bool:
+        with self._lock:
+            if (self._epoch, self._versions.get(key, 0)) != version:
+                return False
+            self._store(key, value, ttl)
+            return True
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._epoch += 1
+            self._versions.clear()
+            self._data.clear()
+            self._expires.clear()
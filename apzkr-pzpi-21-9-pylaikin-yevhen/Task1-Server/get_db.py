@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy_utils import database_exists, create_database
@@ -7,23 +8,32 @@ import Constants
 
 DATABASE_URL = f"postgresql://{Constants.PG_USER}:{Constants.PG_PASSWORD}@" \
                f"{Constants.PG_SERVER}/{Constants.PG_DB}"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{Constants.PG_USER}:{Constants.PG_PASSWORD}@" \
+                     f"{Constants.PG_SERVER}/{Constants.PG_DB}"
 
 engine = create_engine(DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
 
 if not database_exists(engine.url):
     create_database(engine.url)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False, bind=async_engine)
 
 Base = declarative_base()
 
 
 def initialize_db():
     Base.metadata.create_all(bind=engine)
+    # create_all не додає нові індекси до таблиць, що вже існують
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
 
 
-def close_connection():
+async def close_connection():
     engine.dispose()
+    await async_engine.dispose()
 
 
 def get_db():
@@ -34,4 +44,9 @@ def get_db():
         db.close()
 
 
-__all__ = ["get_db"]
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+__all__ = ["get_db", "get_async_db"]
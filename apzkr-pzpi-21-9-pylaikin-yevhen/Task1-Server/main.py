@@ -1,10 +1,18 @@
 from fastapi import FastAPI, APIRouter, Request
-from fastapi.responses import JSONResponse
+from responses import APIJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from get_db import initialize_db, close_connection
+from auth import shutdown_password_executor
 from routers.administration_router import administration_router
 from routers.analytics_router import analytics_router
 from routers.auth_router import auth_router
+from services.analytics_service import shutdown_statistics_executor
+from services.rollup_service import initialize_hourly_rollup
+from services.config_service import deduplicate_device_configs
+from services.ingest_service import start_ingest_buffer, stop_ingest_buffer
+from services.partition_service import initialize_measurement_partitions, run_partition_maintenance
+from Constants import MEASUREMENT_PARTITIONING
+import asyncio
 import sys
 import logging
 from logger import logger
@@ -14,7 +22,8 @@ sys.path.append("/app")
 app = FastAPI(
     title="Програмна система для контролю впливу мікроклімату офісу на активність робітників",
     description="...",
-    version="0.1"
+    version="0.1",
+    default_response_class=APIJSONResponse
 )
 
 api = APIRouter(prefix="/api")
@@ -30,12 +39,25 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup():
     logger.info("Запуск додатку")
+    deduplicate_device_configs()
     initialize_db()
+    initialize_measurement_partitions()
+    initialize_hourly_rollup()
+    start_ingest_buffer()
+    if MEASUREMENT_PARTITIONING:
+        app.state.partition_maintenance = asyncio.create_task(run_partition_maintenance())
 
 
 @app.on_event("shutdown")
 async def shutdown():
     logger.info("Завершення роботи додатку")
+    partition_maintenance = getattr(app.state, "partition_maintenance", None)
+    if partition_maintenance:
+        partition_maintenance.cancel()
+    # Спершу дописуємо буфер прийому, поки пул з'єднань ще відкритий
+    await asyncio.to_thread(stop_ingest_buffer)
+    shutdown_statistics_executor()
+    shutdown_password_executor()
     await close_connection()
 
 
@@ -9,6 +9,7 @@ class DeviceConfig(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
-    device_id = Column(Integer, ForeignKey("devices.id", ondelete="CASCADE"))
+    # Одна конфігурація на пристрій: на унікальному індексі тримається upsert масового імпорту
+    device_id = Column(Integer, ForeignKey("devices.id", ondelete="CASCADE"), unique=True, index=True)
     config_data = Column(JSON)
     device = relationship("Device", back_populates="configs")
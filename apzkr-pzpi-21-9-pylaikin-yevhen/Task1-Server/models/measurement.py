@@ -1,17 +1,24 @@
-from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
+from Constants import MEASUREMENT_PARTITIONING
 from get_db import Base
 
 
 class Measurement(Base):
     __tablename__ = "measurements"
+    # Ключ секціонування має входити до первинного ключа, тому в цьому режимі він складений (id, timestamp)
+    __table_args__ = {"postgresql_partition_by": "RANGE (timestamp)"} if MEASUREMENT_PARTITIONING else {}
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     device_id = Column(Integer, ForeignKey("devices.id"))
-    timestamp = Column(DateTime)
+    timestamp = Column(DateTime, primary_key=MEASUREMENT_PARTITIONING)
     temperature = Column(Float)
     humidity = Column(Float)
     co2 = Column(Float)
     productivity = Column(Integer, nullable=True)
     device = relationship("Device", back_populates="measurements")
+
+
+# Останнє вимірювання пристрою: ORDER BY timestamp DESC LIMIT 1 без сортування
+Index("ix_measurements_device_id_timestamp", Measurement.device_id, Measurement.timestamp.desc())
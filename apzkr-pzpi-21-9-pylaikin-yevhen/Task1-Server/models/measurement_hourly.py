@@ -0,0 +1,57 @@
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, text
+from sqlalchemy.dialects.postgresql import JSONB
+
+from get_db import Base
+
+
+class MeasurementHourly(Base):
+    __tablename__ = "measurement_hourly"
+
+    device_id = Column(Integer, ForeignKey("devices.id", ondelete="CASCADE"), primary_key=True)
+    hour = Column(DateTime, primary_key=True)
+    count = Column(Integer, nullable=False)
+    first_timestamp = Column(DateTime, nullable=False)
+    last_timestamp = Column(DateTime, nullable=False)
+
+    # *_mean і *_m2..*_m4 - середнє та суми степенів відхилень від нього (Welford/Pébay),
+    # *_sketch - квантильний скетч (services/quantile_sketch.py)
+    temperature_sum = Column(Float, nullable=False)
+    temperature_sumsq = Column(Float, nullable=False)
+    temperature_min = Column(Float)
+    temperature_max = Column(Float)
+    temperature_mean = Column(Float, nullable=False)
+    temperature_m2 = Column(Float, nullable=False)
+    temperature_m3 = Column(Float, nullable=False)
+    temperature_m4 = Column(Float, nullable=False)
+    temperature_sketch = Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+
+    humidity_sum = Column(Float, nullable=False)
+    humidity_sumsq = Column(Float, nullable=False)
+    humidity_min = Column(Float)
+    humidity_max = Column(Float)
+    humidity_mean = Column(Float, nullable=False)
+    humidity_m2 = Column(Float, nullable=False)
+    humidity_m3 = Column(Float, nullable=False)
+    humidity_m4 = Column(Float, nullable=False)
+    humidity_sketch = Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+
+    co2_sum = Column(Float, nullable=False)
+    co2_sumsq = Column(Float, nullable=False)
+    co2_min = Column(Float)
+    co2_max = Column(Float)
+    co2_mean = Column(Float, nullable=False)
+    co2_m2 = Column(Float, nullable=False)
+    co2_m3 = Column(Float, nullable=False)
+    co2_m4 = Column(Float, nullable=False)
+    co2_sketch = Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+
+    productivity_count = Column(Integer, nullable=False)
+    productivity_sum = Column(Float, nullable=False)
+    productivity_sumsq = Column(Float, nullable=False)
+    productivity_min = Column(Float)
+    productivity_max = Column(Float)
+    productivity_mean = Column(Float, nullable=False)
+    productivity_m2 = Column(Float, nullable=False)
+    productivity_m3 = Column(Float, nullable=False)
+    productivity_m4 = Column(Float, nullable=False)
+    productivity_sketch = Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
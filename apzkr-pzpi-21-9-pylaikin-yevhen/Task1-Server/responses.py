@@ -0,0 +1,32 @@
+from decimal import Decimal
+from typing import Any
+
+import numpy as np
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+# NaN та нескінченності orjson записує як null, numpy-скаляри й масиви серіалізує напряму
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def orjson_default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    raise TypeError(f"Тип {type(obj).__name__} не підтримується JSON-серіалізацією")
+
+
+def dumps_json(content: Any, indent: bool = False) -> bytes:
+    options = ORJSON_OPTIONS | orjson.OPT_INDENT_2 if indent else ORJSON_OPTIONS
+    return orjson.dumps(content, default=orjson_default, option=options)
+
+
+class APIJSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps_json(content)
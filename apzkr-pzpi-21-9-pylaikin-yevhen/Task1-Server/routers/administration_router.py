@@ -3,32 +3,40 @@ import traceback
 from datetime import datetime
 from typing import List, Optional, Union, Dict
 
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Query, Body, Header, Request
-from fastapi.responses import Response
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Query, Body, Header, Request, BackgroundTasks, \
+    WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 
 from pydantic import ValidationError
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from get_db import get_db
+from get_db import get_db, get_async_db, SessionLocal
 from models.esp import Device
 from models.room import Room
-from services import room_service, device_service, config_service, user_service, analytics_service
+from services import room_service, device_service, config_service, user_service, analytics_service, rescore_service, \
+    export_service, live_service, ingest_service
+from services.statistics_cache import statistics_cache
 from sсhemas.config import ConfigUpdate
 from sсhemas.device import DeviceCreate
 from sсhemas.room import RoomCreate
 from sсhemas.config import ConfigImport
-from sсhemas.config import CustomJSONEncoder
 
-from sсhemas.room import RoomRead
+from sсhemas.room import RoomRead, RoomSummaryPage
 
-from sсhemas.device import DeviceRead
+from sсhemas.device import DeviceRead, DeviceSummaryPage, DeviceMeasurementPage
 
 from logger import logger
+from responses import dumps_json, APIJSONResponse
 
 from models.user import User
 
-from auth import get_current_manager_or_admin, get_current_admin
+from auth import get_current_manager_or_admin, get_current_admin, get_live_viewer, authorize_manager_or_admin, \
+    token_cache, principal_cache
 
 from sсhemas.user import UserRead, ChangeRoleInput
 
@@ -98,45 +106,86 @@ def get_device(
         raise HTTPException(status_code=404, detail=str(e))
 
 
-@administration_router.get("/devices", response_model=List[DeviceRead])
+@administration_router.get("/devices/{mac_address}/measurements", response_model=DeviceMeasurementPage)
+def get_device_measurements(
+        mac_address: str,
+        limit: int = Query(100, ge=1, le=1000, description="Розмір сторінки"),
+        before_timestamp: Optional[datetime] = Query(None, description="Курсор: час останнього вимірювання сторінки"),
+        before_id: Optional[int] = Query(None, description="Курсор: id останнього вимірювання сторінки"),
+        db: Session = Depends(get_db),
+        current_user: User = Depends(get_current_manager_or_admin)):
+    try:
+        return device_service.get_device_measurements(db, mac_address, limit, before_timestamp, before_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@administration_router.get("/devices", response_model=Union[List[DeviceRead], DeviceSummaryPage])
 def get_all_devices(
+        summary: bool = Query(False, description="Коротка сторінка пристроїв без історії вимірювань"),
+        limit: int = Query(100, ge=1, le=1000, description="Розмір сторінки в режимі summary"),
+        after_id: Optional[int] = Query(None, description="Курсор: id останнього пристрою попередньої сторінки"),
         db: Session = Depends(get_db),
         current_user: User = Depends(get_current_manager_or_admin)
 ):
+    if summary:
+        return device_service.get_device_summaries(db, limit, after_id)
     try:
-        return device_service.get_all_devices(db)
+        # Моделі вже провалідовані сервісом: серіалізуємо їх напряму, без повторної перевірки response_model
+        return APIJSONResponse(device_service.get_all_devices(db))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
-@administration_router.get("/rooms", response_model=List[RoomRead])
+@administration_router.get("/rooms", response_model=Union[List[RoomRead], RoomSummaryPage])
 def get_all_rooms(
+        summary: bool = Query(False, description="Коротка сторінка кімнат без пристроїв і вимірювань"),
+        limit: int = Query(100, ge=1, le=1000, description="Розмір сторінки в режимі summary"),
+        after_id: Optional[int] = Query(None, description="Курсор: id останньої кімнати попередньої сторінки"),
         db: Session = Depends(get_db),
         current_user: User = Depends(get_current_manager_or_admin)
 ):
-    return room_service.get_all_rooms(db)
+    if summary:
+        return room_service.get_room_summaries(db, limit, after_id)
+    return APIJSONResponse(room_service.get_all_rooms(db))
 
 
-@administration_router.get("/rooms/{room_id}/devices", response_model=List[DeviceRead])
+@administration_router.get("/rooms/{room_id}/devices", response_model=Union[List[DeviceRead], DeviceSummaryPage])
 def get_room_devices(
         room_id: int,
+        summary: bool = Query(False, description="Коротка сторінка пристроїв без історії вимірювань"),
+        limit: int = Query(100, ge=1, le=1000, description="Розмір сторінки в режимі summary"),
+        after_id: Optional[int] = Query(None, description="Курсор: id останнього пристрою попередньої сторінки"),
         db: Session = Depends(get_db),
         current_user: User = Depends(get_current_manager_or_admin)):
-    return room_service.get_room_devices(db, room_id)
+    if summary:
+        return device_service.get_device_summaries(db, limit, after_id, room_id=room_id)
+    return APIJSONResponse(room_service.get_room_devices(db, room_id))
 
 
 @administration_router.post("/config/import")
 async def import_config(
+        background_tasks: BackgroundTasks,
         file: UploadFile = File(...),
         device_id: Optional[int] = Query(None, description="ID пристрою для імпорту конфігурації"),
-        db: Session = Depends(get_db),
+        rescore: bool = Query(False, description="Перерахувати продуктивність історичних вимірювань"),
+        db: AsyncSession = Depends(get_async_db),
         current_user: User = Depends(get_current_manager_or_admin)
 ):
     content = await file.read()
     try:
         data = json.loads(content)
-        result = config_service.import_config(db, data, device_id)
-        return {"message": f"Успішно імпортовано {result} конфігурацій"}
+        result = await db.run_sync(config_service.import_config, data, device_id)
+        response = {"message": f"Успішно імпортовано {len(result['imported'])} конфігурацій"}
+        if result["errors"]:
+            response["errors"] = result["errors"]
+            if not result["imported"]:
+                raise HTTPException(status_code=400, detail=response)
+        if rescore:
+            response["rescore_job"] = schedule_rescore(background_tasks, result["imported"])
+        return response
+    except HTTPException:
+        raise
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Некоректний формат JSON")
     except ValueError as e:
@@ -161,7 +210,7 @@ def export_config(
         filename = f"config_device_{device_id}_{timestamp}.json"
 
     return Response(
-        content=json.dumps(config_data, cls=CustomJSONEncoder, indent=2, ensure_ascii=False),
+        content=dumps_json(config_data, indent=True),
         media_type="application/json",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
@@ -170,26 +219,27 @@ def export_config(
 @administration_router.get("/device/config")
 async def export_device_config(
         request: Request,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     mac_address = request.headers.get("mac_address")
     if not mac_address:
         raise HTTPException(status_code=400, detail="MAC-адреса не вказана в заголовку")
 
-    device = device_service.get_device_by_mac(db, mac_address)
-    if not device:
+    try:
+        device_id = await db.run_sync(device_service.resolve_device_id, mac_address)
+    except ValueError:
         raise HTTPException(status_code=404, detail="Пристрій з вказаним MAC-адресом не знайдено")
 
     try:
-        config_data = config_service.export_config(db, device.id)
+        config_data = await db.run_sync(config_service.export_config, device_id)
         if not config_data:
             raise HTTPException(status_code=404, detail="Конфігурацію не знайдено")
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"config_device_{device.id}_{timestamp}.json"
+        filename = f"config_device_{device_id}_{timestamp}.json"
 
         return Response(
-            content=json.dumps(config_data, cls=CustomJSONEncoder, indent=2, ensure_ascii=False),
+            content=dumps_json(config_data, indent=True),
             media_type="application/json",
             headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
@@ -201,13 +251,18 @@ async def export_device_config(
 def update_config_parameter(
         device_id: int,
         config_update: ConfigUpdate,
+        background_tasks: BackgroundTasks,
+        rescore: bool = Query(False, description="Перерахувати продуктивність історичних вимірювань"),
         db: Session = Depends(get_db),
         current_user: User = Depends(get_current_manager_or_admin)
 ):
     try:
         updated_config = config_service.update_config_parameter(db, device_id, config_update)
         logger.info(f"Configuration updated successfully for device {device_id}")
-        return {"message": "Конфігурацію успішно оновлено", "updated_config": updated_config}
+        response = {"message": "Конфігурацію успішно оновлено", "updated_config": updated_config}
+        if rescore:
+            response["rescore_job"] = schedule_rescore(background_tasks, [device_id])
+        return response
     except ValidationError as e:
         logger.error(f"Validation error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -224,13 +279,66 @@ def update_config_parameter(
         raise HTTPException(status_code=500, detail="Внутрішня помилка сервера")
 
 
+def schedule_rescore(background_tasks: BackgroundTasks, device_ids: List[int]) -> dict:
+    job = rescore_service.create_rescore_job(device_ids)
+    background_tasks.add_task(rescore_service.run_rescore_job, job["job_id"])
+    return job
+
+
+@administration_router.post("/rescore")
+def start_rescore(
+        background_tasks: BackgroundTasks,
+        device_id: Optional[int] = Query(None, description="ID пристрою для перерахунку"),
+        room_id: Optional[int] = Query(None, description="ID кімнати для перерахунку"),
+        db: Session = Depends(get_db),
+        current_user: User = Depends(get_current_manager_or_admin)
+):
+    if (device_id is None) == (room_id is None):
+        raise HTTPException(status_code=400, detail="Потрібно вказати або device_id, або room_id")
+    try:
+        device_ids = [device_id] if device_id is not None else rescore_service.get_room_device_ids(db, room_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return schedule_rescore(background_tasks, device_ids)
+
+
+@administration_router.get("/rescore/{job_id}")
+def get_rescore_status(
+        job_id: str,
+        current_user: User = Depends(get_current_manager_or_admin)
+):
+    try:
+        return rescore_service.get_rescore_job(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
 @administration_router.get("/measurements/export")
 def export_measurements(
-        db: Session = Depends(get_db),
+        format: str = Query("json", pattern="^(json|ndjson|csv|parquet|arrow)$", description="Формат експорту"),
+        device_id: Optional[int] = Query(None, description="ID пристрою"),
+        room_id: Optional[int] = Query(None, description="ID кімнати"),
+        time_from: Optional[datetime] = Query(None, description="Початок періоду"),
+        time_to: Optional[datetime] = Query(None, description="Кінець періоду"),
+        compress: bool = Query(False, description="Стиснути відповідь gzip"),
         current_user: User = Depends(get_current_manager_or_admin)
 ):
-    measurements = device_service.export_measurements(db)
-    return measurements
+    if format in export_service.COLUMNAR_FORMATS and not export_service.columnar_export_available():
+        raise HTTPException(status_code=501, detail="Експорт у форматі Parquet/Arrow потребує пакета pyarrow")
+
+    filename = export_service.export_filename(format, compress)
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    media_type = export_service.EXPORT_MEDIA_TYPES[format]
+    if compress:
+        media_type = "application/gzip"
+    return StreamingResponse(
+        export_service.stream_measurements(
+            format, compress,
+            device_id=device_id, room_id=room_id, time_from=time_from, time_to=time_to
+        ),
+        media_type=media_type,
+        headers=headers
+    )
 
 
 @administration_router.post("/ban/{username}")
@@ -278,14 +386,111 @@ def get_users(
 ):
     return user_service.get_all_users(db)
 
+
+@administration_router.get("/cache/stats")
+def get_cache_stats(current_user: User = Depends(get_current_admin)):
+    return {
+        "device_ids": device_service.device_id_cache.stats(),
+        "device_configs": config_service.config_cache.stats(),
+        "auth_tokens": token_cache.stats(),
+        "auth_principals": principal_cache.stats(),
+        "latest_readings": live_service.stats(),
+        "statistics": statistics_cache.stats(),
+        "ingest_buffer": ingest_service.ingest_buffer.stats() if ingest_service.ingest_buffer else None
+    }
+
+
 @administration_router.get("/rooms/{room_id}/latest_data")
 async def get_room_latest_data_route(
         room_id: int,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
         current_user: User = Depends(get_current_manager_or_admin)
 ):
     try:
-        room_data = analytics_service.get_room_latest_data(db, room_id)
+        room_data = await db.run_sync(analytics_service.get_room_latest_data, room_id)
         return room_data
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+
+@administration_router.get("/rooms/{room_id}/live")
+async def stream_room_live(
+        room_id: int,
+        db: AsyncSession = Depends(get_async_db),
+        current_user: User = Depends(get_live_viewer)
+):
+    # Підписка до знімка: вимірювання, що прийдуть під час його побудови, не загубляться
+    subscriber = live_service.LiveSubscriber(room_id, asyncio.get_running_loop())
+    live_service.subscribe(subscriber)
+    try:
+        snapshot = await db.run_sync(analytics_service.get_room_live_snapshot, room_id)
+    except ValueError as e:
+        live_service.unsubscribe(subscriber)
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        live_service.unsubscribe(subscriber)
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        live_service.sse_stream(subscriber, snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def open_live_feed(token: Optional[str], room_id: int, subscriber: live_service.LiveSubscriber) -> dict:
+    db = SessionLocal()
+    try:
+        authorize_manager_or_admin(db, token)
+        # Підписка лише після авторизації, але до знімка: вимірювання, що прийдуть під час його побудови,
+        # не загубляться
+        live_service.subscribe(subscriber)
+        return analytics_service.get_room_live_snapshot(db, room_id)
+    finally:
+        db.close()
+
+
+async def wait_for_disconnect(websocket: WebSocket) -> None:
+    # Клієнт нічого не надсилає, але без читання розрив з'єднання помітний лише при наступному надсиланні
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+
+async def send_live_events(websocket: WebSocket, subscriber: live_service.LiveSubscriber, snapshot: dict) -> None:
+    await websocket.send_text(dumps_json({"type": "snapshot", "data": snapshot}).decode())
+    async for event_type, data in live_service.iter_live_events(subscriber):
+        await websocket.send_text(dumps_json({"type": event_type, "data": data}).decode())
+        if event_type == "dropped":
+            await websocket.close(code=1013)
+            return
+
+
+@administration_router.websocket("/rooms/{room_id}/live/ws")
+async def websocket_room_live(websocket: WebSocket, room_id: int, token: Optional[str] = Query(None)):
+    await websocket.accept()
+    subscriber = live_service.LiveSubscriber(room_id, asyncio.get_running_loop())
+    try:
+        try:
+            snapshot = await run_in_threadpool(open_live_feed, token, room_id, subscriber)
+        except HTTPException as e:
+            await websocket.close(code=1008, reason=e.detail)
+            return
+        except ValueError as e:
+            await websocket.close(code=1008, reason=str(e))
+            return
+
+        # Відправлення й читання йдуть паралельно: хто завершився першим, той і закриває з'єднання
+        tasks = {asyncio.create_task(send_live_events(websocket, subscriber, snapshot)),
+                 asyncio.create_task(wait_for_disconnect(websocket))}
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        live_service.unsubscribe(subscriber)
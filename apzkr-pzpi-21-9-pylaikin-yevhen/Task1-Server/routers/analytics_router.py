@@ -1,12 +1,16 @@
 from fastapi import APIRouter, HTTPException, Depends
 
-from services import analytics_service, device_service
+from services import analytics_service, device_service, timeseries_service
+from services.ingest_service import IngestBufferFull
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from starlette.responses import FileResponse
 
-from sсhemas.analytics import StatisticsInput, PredictionInput, StatisticsResponse, RoomStatisticsInput
+from sсhemas.analytics import StatisticsInput, PredictionInput, StatisticsResponse, RoomStatisticsInput, \
+    PredictionBatchInput, TimeSeriesInput, TimeSeriesResponse
 
-from get_db import get_db
+from get_db import get_db, get_async_db
+from responses import APIJSONResponse
 
 from sсhemas.measurement import EnvironmentDataInput
 
@@ -16,32 +20,56 @@ analytics_router = APIRouter(tags=["analytics"], prefix="/analytics")
 @analytics_router.post("/predict")
 def predict_productivity(input_data: PredictionInput, db: Session = Depends(get_db)):
     try:
-        device = device_service.get_device_by_mac(db, input_data.mac_address)
-        if not device:
-            raise HTTPException(status_code=404, detail=f"Пристрій з MAC-адресом {input_data.mac_address} не знайдено")
-
+        device_id = device_service.resolve_device_id(db, input_data.mac_address)
         prediction, recommendations = analytics_service.calculate_prediction(
-            db, device.id, input_data.Temperature, input_data.Humidity, input_data.CO2
+            db, device_id, input_data.Temperature, input_data.Humidity, input_data.CO2
         )
         return {"prediction": prediction, "recommendations": recommendations}
+    except IngestBufferFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@analytics_router.post("/predict/batch")
+def predict_productivity_batch(input_data: PredictionBatchInput, db: Session = Depends(get_db)):
+    try:
+        results = analytics_service.calculate_batch_prediction(db, input_data.readings)
+        return {"results": results}
+    except IngestBufferFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @analytics_router.post("/statistics/all", response_model=StatisticsResponse)
-async def get_all_statistics(input_data: StatisticsInput, db: Session = Depends(get_db)):
+async def get_all_statistics(input_data: StatisticsInput, db: AsyncSession = Depends(get_async_db)):
     try:
-        statistics = analytics_service.get_statistics(db, input_data.time_from, input_data.time_to)
-        return StatisticsResponse(statistics=statistics)
+        statistics = await analytics_service.get_statistics(db, input_data.time_from, input_data.time_to,
+                                                            exact=input_data.exact)
+        return APIJSONResponse(StatisticsResponse(statistics=statistics))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @analytics_router.post("/statistics/room", response_model=StatisticsResponse)
-async def get_room_statistics(input_data: RoomStatisticsInput, db: Session = Depends(get_db)):
+async def get_room_statistics(input_data: RoomStatisticsInput, db: AsyncSession = Depends(get_async_db)):
     try:
-        statistics = analytics_service.get_statistics(db, input_data.time_from, input_data.time_to, input_data.room_id)
-        return StatisticsResponse(statistics=statistics)
+        statistics = await analytics_service.get_statistics(db, input_data.time_from, input_data.time_to,
+                                                            input_data.room_id, input_data.exact)
+        return APIJSONResponse(StatisticsResponse(statistics=statistics))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@analytics_router.post("/timeseries", response_model=TimeSeriesResponse)
+async def get_time_series(input_data: TimeSeriesInput, db: AsyncSession = Depends(get_async_db)):
+    try:
+        series = await timeseries_service.get_time_series(
+            db, input_data.time_from, input_data.time_to, input_data.room_id, input_data.mac_address,
+            input_data.max_points, input_data.mode
+        )
+        return APIJSONResponse(TimeSeriesResponse(series=series))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -1,5 +1,8 @@
+import asyncio
 import math
-from datetime import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
 from typing import List, Tuple, Dict, Optional, Any
 
 import numpy as np
@@ -7,16 +10,28 @@ import pandas as pd
 from models.deviceconfig import DeviceConfig
 from models.esp import Device
 from models.measurement import Measurement
+from models.room import Room
+from services import device_service, config_service, rollup_service, live_service, ingest_service
+from services.statistics_cache import statistics_cache
+from Constants import STATS_PROCESS_WORKERS, STATS_PUSHDOWN_ROWS
+from sqlalchemy import Float, cast, func, insert, select, true
+from sqlalchemy.dialects.postgresql import array
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sсhemas.analytics import StatisticsOutput
+from sсhemas.analytics import StatisticsOutput, PredictionInput
 from sсhemas.measurement import EnvironmentDataInput
+from services.statistics_worker import (
+    compute_devices_statistics, compute_devices_rollup_statistics, compute_device_aggregate_statistics
+)
+
+_statistics_executor: Optional[ProcessPoolExecutor] = None
+
+
+NON_FINITE_READING_ERROR = "Температура, вологість і CO2 повинні бути скінченними числами"
 
 
 def get_device_config(db: Session, device_id: int) -> Dict:
-    device_config = db.query(DeviceConfig).filter(DeviceConfig.device_id == device_id).first()
-    if not device_config:
-        raise ValueError(f"Конфігурацію для пристрою з id {device_id} не знайдено")
-    return device_config.config_data
+    return config_service.get_config_data(db, device_id)
 
 
 def calculate_adjustment_factor(current_val, min_val, max_val, ideal_val, key):
@@ -79,28 +94,96 @@ def calculate_productivity(temperature, humidity, co2, config):
     return round(overall_score)
 
 
+def calculate_productivity_vectorized(temperature, humidity, co2, config) -> np.ndarray:
+    temperature = np.asarray(temperature, dtype=np.float64)
+    humidity = np.asarray(humidity, dtype=np.float64)
+    co2 = np.asarray(co2, dtype=np.float64)
+    # NaN після np.rint().astype стало б INT64_MIN без жодної помилки, тоді як скалярна функція падає
+    if not (np.isfinite(temperature).all() and np.isfinite(humidity).all() and np.isfinite(co2).all()):
+        raise ValueError(NON_FINITE_READING_ERROR)
+
+    ideal = config['ideal_values']
+    min_values = config['min_values']
+    max_values = config['max_values']
+    co2_ideal = ideal['CO2']
+    co2_max = max_values['CO2']
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        temperature_score = np.exp(-((temperature - ideal['Temperature']) ** 2) / 50)
+        humidity_score = np.exp(-((humidity - ideal['Humidity']) ** 2) / 100)
+        co2_score = np.where(
+            co2 <= co2_ideal,
+            1.0,
+            1 - np.log(1 + (co2 - co2_ideal) / (co2_max - co2_ideal)) / math.log(3)
+        )
+
+        temperature_score = np.where(
+            (temperature < min_values['Temperature']) | (temperature > max_values['Temperature']),
+            0.0, temperature_score)
+        humidity_score = np.where(
+            (humidity < min_values['Humidity']) | (humidity > max_values['Humidity']), 0.0, humidity_score)
+        co2_score = np.where((co2 < min_values['CO2']) | (co2 > co2_max), 0.0, co2_score)
+
+        overall_score = np.power(
+            np.power(temperature_score, 5) * np.power(humidity_score, 3) * co2_score,
+            1 / 9
+        ) * 100
+
+    productivity = np.rint(overall_score).astype(np.int64)
+
+    # SIMD-реалізації exp/log/pow у NumPy можуть відрізнятися від libm на кілька ulp,
+    # тому значення на межі округлення перераховуються скалярною функцією
+    fraction = overall_score - np.floor(overall_score)
+    for i in np.flatnonzero(np.abs(fraction - 0.5) < 1e-9):
+        productivity.flat[i] = calculate_productivity(
+            float(temperature.flat[i]), float(humidity.flat[i]), float(co2.flat[i]), config
+        )
+
+    return productivity
+
+
 def calculate_and_save_prediction(db: Session, device_id: int, temperature: float, humidity: float,
                                   co2: float) -> float:
+    if not all(math.isfinite(value) for value in (temperature, humidity, co2)):
+        raise ValueError(NON_FINITE_READING_ERROR)
     config = get_device_config(db, device_id)
     prediction = calculate_productivity(temperature, humidity, co2, config)
 
-    new_measurement = Measurement(
-        device_id=device_id,
-        timestamp=datetime.utcnow(),
-        temperature=temperature,
-        humidity=humidity,
-        co2=co2,
-        productivity=prediction
-    )
-    db.add(new_measurement)
-    db.commit()
+    save_measurements(db, [{
+        "device_id": device_id,
+        "timestamp": datetime.utcnow(),
+        "temperature": temperature,
+        "humidity": humidity,
+        "co2": co2,
+        "productivity": prediction
+    }])
 
     return prediction
 
 
+def save_measurements(db: Session, rows: List[Dict[str, Any]]) -> None:
+    if not rows:
+        return
+    if ingest_service.ingest_buffer is not None:
+        # Відкладений запис: вимірювання пишуться пакетами через COPY фоновим потоком
+        ingest_service.ingest_buffer.submit(rows)
+        return
+    # Один багаторядковий INSERT замість окремого db.add на кожне вимірювання
+    db.execute(insert(Measurement), rows)
+    rollup_service.upsert_hourly(db, rows)
+    db.commit()
+    live_service.record_measurements(rows)
+    statistics_cache.record_measurements(rows)
+
+
 def generate_recommendations(db: Session, device_id: int, temperature: float, humidity: float, co2: float,
                              prediction: float) -> List[str]:
     config = get_device_config(db, device_id)
+    return build_recommendations(config, temperature, humidity, co2, prediction)
+
+
+def build_recommendations(config: Dict, temperature: float, humidity: float, co2: float,
+                          prediction: float) -> List[str]:
     recommendations = []
 
     if prediction < config.get('productivity_norm', 80):
@@ -129,6 +212,77 @@ def calculate_prediction(db: Session, device_id: int, temperature: float, humidi
     return prediction, recommendations
 
 
+def calculate_batch_prediction(db: Session, readings: List[PredictionInput]) -> List[Dict[str, Any]]:
+    device_ids = device_service.resolve_device_ids(db, (reading.mac_address for reading in readings))
+    configs = config_service.get_configs_data(db, list(device_ids.values()))
+
+    # Pydantic пропускає NaN та Infinity з JSON: такі вимірювання відхиляються поодинці,
+    # а не зривають запис усього пакета
+    finite = np.isfinite(np.array(
+        [(reading.Temperature, reading.Humidity, reading.CO2) for reading in readings], dtype=np.float64
+    )).all(axis=1)
+
+    readings_by_device = {}
+    for index, reading in enumerate(readings):
+        device_id = device_ids.get(reading.mac_address)
+        if device_id in configs and finite[index]:
+            readings_by_device.setdefault(device_id, []).append(index)
+
+    predictions = {}
+    for device_id, indexes in readings_by_device.items():
+        scores = calculate_productivity_vectorized(
+            [readings[i].Temperature for i in indexes],
+            [readings[i].Humidity for i in indexes],
+            [readings[i].CO2 for i in indexes],
+            configs[device_id]
+        )
+        predictions.update(zip(indexes, scores.tolist()))
+
+    # Кожне вимірювання пакета отримує власну мітку часу в порядку надходження: інакше всі вони
+    # збігаються, а вибірки за часом (останнє вимірювання, LTTB, keyset) не можуть їх упорядкувати
+    base_timestamp = datetime.utcnow()
+    results = []
+    rows = []
+    for index, reading in enumerate(readings):
+        device_id = device_ids.get(reading.mac_address)
+        if device_id is None:
+            results.append({
+                "mac_address": reading.mac_address,
+                "error": f"Пристрій з MAC-адресом {reading.mac_address} не знайдено"
+            })
+            continue
+        config = configs.get(device_id)
+        if config is None:
+            results.append({
+                "mac_address": reading.mac_address,
+                "error": f"Конфігурацію для пристрою з id {device_id} не знайдено"
+            })
+            continue
+        if not finite[index]:
+            results.append({"mac_address": reading.mac_address, "error": NON_FINITE_READING_ERROR})
+            continue
+
+        prediction = predictions[index]
+        recommendations = build_recommendations(config, reading.Temperature, reading.Humidity, reading.CO2,
+                                                prediction)
+        rows.append({
+            "device_id": device_id,
+            "timestamp": base_timestamp + timedelta(microseconds=index),
+            "temperature": reading.Temperature,
+            "humidity": reading.Humidity,
+            "co2": reading.CO2,
+            "productivity": prediction
+        })
+        results.append({
+            "mac_address": reading.mac_address,
+            "prediction": prediction,
+            "recommendations": recommendations
+        })
+
+    save_measurements(db, rows)
+    return results
+
+
 def get_latest_measurement_with_productivity(db: Session, device_id: int) -> Optional[Dict[str, Any]]:
     latest_measurement = db.query(Measurement).filter(Measurement.device_id == device_id).order_by(
         Measurement.timestamp.desc()).first()
@@ -143,36 +297,71 @@ def get_latest_measurement_with_productivity(db: Session, device_id: int) -> Opt
     }
 
 
+def get_room_snapshot(db: Session, room_id: int, device_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    # Один запит замість двох на кожен пристрій: LATERAL бере останнє вимірювання
+    # через індекс (device_id, timestamp DESC) і конфігурацію пристрою
+    latest = device_service.latest_measurement_lateral()
+    config = select(DeviceConfig.config_data).where(
+        DeviceConfig.device_id == Device.id
+    ).limit(1).lateral("config")
+
+    query = select(
+        Device.id.label("device_id"), Device.mac_address,
+        latest.c.timestamp, latest.c.temperature, latest.c.humidity, latest.c.co2, latest.c.productivity,
+        config.c.config_data
+    ).select_from(Device).join(latest, true()).outerjoin(config, true()).where(Device.room_id == room_id)
+    if device_ids is not None:
+        query = query.where(Device.id.in_(device_ids))
+
+    rows = db.execute(query.order_by(Device.id)).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def get_room_latest_rows(db: Session, room_id: int) -> List[Dict[str, Any]]:
+    # Останні значення обслуговуються з пам'яті; в БД ідуть лише пристрої, яких ще немає в кеші
+    devices = live_service.get_room_devices(db, room_id)
+    readings, missing = live_service.get_latest_readings(devices.keys())
+    if missing:
+        fetched = {row["device_id"]: row for row in get_room_snapshot(db, room_id, missing)}
+        live_service.store_latest_readings({device_id: fetched.get(device_id) for device_id in missing})
+        readings.update(fetched)
+
+    readings = {device_id: reading for device_id, reading in readings.items() if reading is not None}
+    configs = config_service.get_configs_data(db, list(readings.keys()))
+    return [
+        {
+            "device_id": device_id,
+            "mac_address": devices[device_id],
+            **{field: readings[device_id][field] for field in live_service.READING_FIELDS},
+            "config_data": configs.get(device_id)
+        }
+        for device_id in sorted(readings)
+    ]
+
+
+def _snapshot_recommendations(row: Dict[str, Any]) -> List[str]:
+    if row["config_data"] is None:
+        raise ValueError(f"Конфігурацію для пристрою з id {row['device_id']} не знайдено")
+    return build_recommendations(row["config_data"], row["temperature"], row["humidity"], row["co2"],
+                                 row["productivity"])
+
+
 def get_room_latest_measurements(db: Session, room_id: int) -> List[Dict[str, Any]]:
-    devices = db.query(Device).filter(Device.room_id == room_id).all()
-    latest_measurements = []
-    for device in devices:
-        measurement = get_latest_measurement_with_productivity(db, device.id)
-        if measurement:
-            latest_measurements.append({
-                "device_id": device.id,
-                "mac_address": device.mac_address,
-                **measurement
-            })
-    return latest_measurements
+    return [
+        {key: value for key, value in row.items() if key != "config_data"}
+        for row in get_room_latest_rows(db, room_id)
+    ]
 
 
 def get_latest_productivity_and_recommendations(db: Session, room_id: int) -> Dict[str, Any]:
-    devices = db.query(Device).filter(Device.room_id == room_id).all()
     latest_data = []
 
-    for device in devices:
-        latest_measurement = get_latest_measurement_with_productivity(db, device.id)
-        if latest_measurement:
-            config = get_device_config(db, device.id)
-            recommendations = generate_recommendations(db, device.id, latest_measurement['temperature'],
-                                                       latest_measurement['humidity'], latest_measurement['co2'],
-                                                       latest_measurement['productivity'])
-            latest_data.append({
-                "device_id": device.id,
-                "productivity": latest_measurement['productivity'],
-                "recommendations": recommendations
-            })
+    for row in get_room_latest_rows(db, room_id):
+        latest_data.append({
+            "device_id": row["device_id"],
+            "productivity": row["productivity"],
+            "recommendations": _snapshot_recommendations(row)
+        })
 
     if not latest_data:
         return {"average_productivity": 0, "recommendations": []}
@@ -186,33 +375,32 @@ def get_latest_productivity_and_recommendations(db: Session, room_id: int) -> Di
     }
 
 
+def get_room_live_snapshot(db: Session, room_id: int) -> Dict[str, Any]:
+    if db.query(Room.id).filter(Room.id == room_id).scalar() is None:
+        raise ValueError(f"Кімнату з id {room_id} не знайдено")
+    return get_room_latest_data(db, room_id)
+
+
 def get_room_latest_data(db: Session, room_id: int) -> Dict[str, Any]:
-    devices = db.query(Device).filter(Device.room_id == room_id).all()
     devices_data = []
     total_productivity = 0
     all_recommendations = set()
 
-    for device in devices:
-        measurement = get_latest_measurement_with_productivity(db, device.id)
-        if measurement:
-            config = get_device_config(db, device.id)
-            recommendations = generate_recommendations(
-                db, device.id,
-                measurement['temperature'],
-                measurement['humidity'],
-                measurement['co2'],
-                measurement['productivity']
-            )
-
-            device_data = {
-                "device_id": device.id,
-                "mac_address": device.mac_address,
-                **measurement,
-                "recommendations": recommendations
-            }
-            devices_data.append(device_data)
-            total_productivity += measurement['productivity']
-            all_recommendations.update(recommendations)
+    for row in get_room_latest_rows(db, room_id):
+        recommendations = _snapshot_recommendations(row)
+        device_data = {
+            "device_id": row["device_id"],
+            "mac_address": row["mac_address"],
+            "timestamp": row["timestamp"],
+            "temperature": row["temperature"],
+            "humidity": row["humidity"],
+            "co2": row["co2"],
+            "productivity": row["productivity"],
+            "recommendations": recommendations
+        }
+        devices_data.append(device_data)
+        total_productivity += row['productivity']
+        all_recommendations.update(recommendations)
 
     num_devices = len(devices_data)
     average_productivity = total_productivity / num_devices if num_devices > 0 else 0
@@ -224,88 +412,178 @@ def get_room_latest_data(db: Session, room_id: int) -> Dict[str, Any]:
     }
 
 
-def clean_float(value):
-    if isinstance(value, (float, np.floating)):
-        if math.isnan(value) or math.isinf(value):
-            return None
-    return value
+def get_statistics_executor() -> Optional[ProcessPoolExecutor]:
+    global _statistics_executor
+    if _statistics_executor is None and STATS_PROCESS_WORKERS > 0:
+        # spawn замість fork: дочірні процеси не успадковують пули з'єднань і потоки сервера
+        _statistics_executor = ProcessPoolExecutor(
+            max_workers=STATS_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _statistics_executor
+
+
+def shutdown_statistics_executor() -> None:
+    global _statistics_executor
+    if _statistics_executor is not None:
+        _statistics_executor.shutdown(wait=True, cancel_futures=True)
+        _statistics_executor = None
+
+
+async def compute_statistics(compute, groups: List[Tuple]) -> List[Dict[str, Any]]:
+    loop = asyncio.get_running_loop()
+    executor = get_statistics_executor()
+    if executor is None or len(groups) < 2:
+        return await loop.run_in_executor(executor, compute, groups)
+
+    # Послідовні частини зберігають порядок пристроїв після об'єднання результатів
+    chunk_count = min(STATS_PROCESS_WORKERS, len(groups))
+    chunk_size = math.ceil(len(groups) / chunk_count)
+    chunks = [groups[i:i + chunk_size] for i in range(0, len(groups), chunk_size)]
+    results = await asyncio.gather(*(
+        loop.run_in_executor(executor, compute, chunk) for chunk in chunks
+    ))
+    return [stats for chunk_stats in results for stats in chunk_stats]
+
+
+async def get_statistics(db: AsyncSession, time_from: datetime, time_to: datetime,
+                         room_id: Optional[int] = None, exact: bool = False) -> List[StatisticsOutput]:
+    key = (room_id, time_from, time_to, exact)
+    cached = statistics_cache.get(key)
+    if cached is not None:
+        return cached
+    version, ttl = statistics_cache.reserve(key, time_to)
+
+    if exact:
+        # Точні квантилі по сирих вимірюваннях; великі діапазони агрегуються в Postgres,
+        # щоб не передавати всі рядки в pandas
+        if await rollup_service.estimate_measurements(db, time_from, time_to, room_id) > STATS_PUSHDOWN_ROWS:
+            raw_stats = await get_sql_statistics(db, time_from, time_to, room_id)
+        else:
+            raw_stats = await get_measurement_statistics(db, time_from, time_to, room_id)
+    else:
+        raw_stats = await get_rollup_statistics(db, time_from, time_to, room_id)
 
+    device_stats = []
+    for stats in raw_stats:
+        try:
+            device_stats.append(StatisticsOutput(**stats))
+        except Exception as e:
+            print(f"Помилка при розрахунку статистики для девайсу з  {stats.get('device_id')}: {str(e)}")
+            continue
 
-def clean_dict(d):
-    return {k: clean_float(v) if isinstance(v, (float, np.floating)) else v for k, v in d.items()}
+    statistics_cache.set_if_current(key, device_stats, version, ttl)
+    return device_stats
 
 
-def get_statistics(db: Session, time_from: datetime, time_to: datetime, room_id: Optional[int] = None) -> List[
-    StatisticsOutput]:
-    query = db.query(Measurement).filter(Measurement.timestamp.between(time_from, time_to))
+async def get_measurement_statistics(db: AsyncSession, time_from: datetime, time_to: datetime,
+                                     room_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    query = select(
+        Measurement.device_id, Measurement.timestamp, Measurement.temperature,
+        Measurement.humidity, Measurement.co2, Measurement.productivity
+    ).where(Measurement.timestamp.between(time_from, time_to))
     if room_id:
-        query = query.join(Device).filter(Device.room_id == room_id)
+        query = query.join(Device).where(Device.room_id == room_id)
 
-    df = pd.read_sql(query.statement, db.bind)
+    result = await db.execute(query)
+    df = pd.DataFrame(result.all(), columns=list(result.keys()))
 
     if df.empty:
         return []
 
-    device_stats = []
-    for device_id, device_df in df.groupby('device_id'):
-        try:
-            stats = {
-                'device_id': f'device_{device_id}',
-                'temperature': calculate_parameter_stats(device_df['temperature']),
-                'humidity': calculate_parameter_stats(device_df['humidity']),
-                'co2': calculate_parameter_stats(device_df['co2']),
-                'productivity': calculate_parameter_stats(device_df['productivity']),
-                'time_stats': calculate_time_stats(device_df)
-            }
-            device_stats.append(StatisticsOutput(**clean_dict(stats)))
-        except Exception as e:
-            print(f"Помилка при розрахунку статистики для девайсу з  {device_id}: {str(e)}")
-            continue
+    groups = [(device_id, device_df) for device_id, device_df in df.groupby('device_id')]
+    return await compute_statistics(compute_devices_statistics, groups)
 
-    return device_stats
 
+async def get_sql_statistics(db: AsyncSession, time_from: datetime, time_to: datetime,
+                             room_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    # Ті самі показники, що й get_measurement_statistics, але з Postgres повертається лише рядок
+    # на пристрій і рядок на годину; percentile_cont інтерполює так само, як pandas quantile
+    channels = rollup_service.CHANNELS
+    filters = [Measurement.timestamp.between(time_from, time_to)]
+    if room_id:
+        filters.append(Measurement.device_id.in_(select(Device.id).where(Device.room_id == room_id)))
+
+    rows = select(
+        Measurement.device_id,
+        *[cast(getattr(Measurement, channel), Float).label(channel) for channel in channels],
+        *[func.avg(cast(getattr(Measurement, channel), Float)).over(partition_by=Measurement.device_id)
+          .label(f"{channel}_device_mean") for channel in channels]
+    ).where(*filters).subquery()
+
+    columns = []
+    for channel in channels:
+        value = rows.c[channel]
+        deviation = value - rows.c[f"{channel}_device_mean"]
+        columns += [
+            func.count(value).label(f"{channel}_count"),
+            func.avg(value).label(f"{channel}_mean"),
+            func.stddev_samp(value).label(f"{channel}_std"),
+            func.min(value).label(f"{channel}_min"),
+            func.max(value).label(f"{channel}_max"),
+            func.percentile_cont(array([0.25, 0.5, 0.75])).within_group(value).label(f"{channel}_quartiles"),
+            func.sum(deviation * deviation).label(f"{channel}_m2"),
+            func.sum(deviation * deviation * deviation).label(f"{channel}_m3"),
+            func.sum(deviation * deviation * deviation * deviation).label(f"{channel}_m4")
+        ]
+    result = await db.execute(select(rows.c.device_id, *columns).group_by(rows.c.device_id))
+    aggregates = {row["device_id"]: row for row in result.mappings()}
+    if not aggregates:
+        return []
 
-def calculate_parameter_stats(series: pd.Series) -> Dict:
-    try:
-        return clean_dict({
-            'mean': series.mean(),
-            'median': series.median(),
-            'std': series.std(),
-            'min': series.min(),
-            'max': series.max(),
-            'quartiles': series.quantile([0.25, 0.5, 0.75]).tolist(),
-            'iqr': series.quantile(0.75) - series.quantile(0.25),
-            'skewness': series.skew(),
-            'kurtosis': series.kurtosis()
-        })
-    except Exception as e:
-        print(f"Помилка при розрахунку статистичних параметрів: {str(e)}")
-        return {}
+    hour = func.date_trunc('hour', Measurement.timestamp)
+    result = await db.execute(select(
+        Measurement.device_id, hour.label("hour"), func.count().label("count"),
+        func.count(Measurement.productivity).label("productivity_count"),
+        func.min(Measurement.timestamp).label("first_timestamp"),
+        func.max(Measurement.timestamp).label("last_timestamp"),
+        *[func.sum(cast(getattr(Measurement, channel), Float)).label(f"{channel}_sum") for channel in channels]
+    ).where(*filters).group_by(Measurement.device_id, hour))
+    hourly_df = pd.DataFrame(result.all(), columns=list(result.keys()))
+
+    device_stats = []
+    for device_id, device_hourly_df in hourly_df.groupby('device_id'):
+        stats = compute_device_aggregate_statistics(device_id, aggregates[device_id], device_hourly_df)
+        if stats is not None:
+            device_stats.append(stats)
+    return device_stats
 
 
-def calculate_time_stats(df: pd.DataFrame) -> Dict:
-    try:
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.set_index('timestamp')
-        hourly_means = df.resample('h').mean()
-
-        hourly_trends = {
-            'temperature': hourly_means['temperature'].tolist(),
-            'humidity': hourly_means['humidity'].tolist(),
-            'co2': hourly_means['co2'].tolist(),
-            'productivity': hourly_means['productivity'].tolist() if 'productivity' in hourly_means.columns else None
-        }
+async def get_edge_rollups(db: AsyncSession, time_from: datetime, time_to: datetime,
+                           first_hour: datetime, last_hour: datetime,
+                           room_id: Optional[int] = None) -> pd.DataFrame:
+    # Неповні години на краях діапазону агрегуються з сирих вимірювань тим самим кодом,
+    # що й під час прийому, тож далі вони об'єднуються з measurement_hourly без різниці
+    query = select(
+        Measurement.device_id, Measurement.timestamp, Measurement.temperature,
+        Measurement.humidity, Measurement.co2, Measurement.productivity
+    ).where(
+        Measurement.timestamp.between(time_from, time_to),
+        ~((Measurement.timestamp >= first_hour) & (Measurement.timestamp < last_hour))
+    )
+    if room_id:
+        query = query.join(Device).where(Device.room_id == room_id)
+
+    result = await db.execute(query)
+    return pd.DataFrame(rollup_service.aggregate_hourly(result.mappings()))
+
+
+async def get_rollup_statistics(db: AsyncSession, time_from: datetime, time_to: datetime,
+                                room_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    # Усі показники об'єднуються з моментів і квантильних скетчів погодинних агрегатів;
+    # повні години [first_hour, last_hour) беруться з measurement_hourly
+    first_hour = rollup_service.hour_ceil(time_from)
+    last_hour = rollup_service.hour_bucket(time_to)
+    frames = [await get_edge_rollups(db, time_from, time_to, first_hour, last_hour, room_id)]
+    if first_hour < last_hour:
+        frames.append(await rollup_service.get_hourly_rollups(db, first_hour, last_hour, room_id))
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return []
+    hourly_df = pd.concat(frames, ignore_index=True).sort_values(['device_id', 'hour'])
 
-        return clean_dict({
-            'start_time': df.index.min().isoformat(),
-            'end_time': df.index.max().isoformat(),
-            'duration': (df.index.max() - df.index.min()).total_seconds() / 3600,
-            'hourly_trends': {k: [clean_float(v) for v in values] for k, values in hourly_trends.items() if
-                              values is not None}
-        })
-    except Exception as e:
-        print(f"Помилка при розрахунку даних часового ряду: {str(e)}")
-        return {}
+    groups = [(device_id, device_hourly_df) for device_id, device_hourly_df in hourly_df.groupby('device_id')]
+    return await compute_statistics(compute_devices_rollup_statistics, groups)
 
 
 def record_environment_data(db: Session, input_data: EnvironmentDataInput):
@@ -1,20 +1,29 @@
 import copy
 import traceback
-from typing import Optional, Dict, Any, List, Union
+from typing import Optional, Dict, Any, List, Tuple, Union
 
 from fastapi import UploadFile, HTTPException
-from sqlalchemy import inspect
+from pydantic import ValidationError
+from sqlalchemy import delete, inspect, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 import json
 
+from cache import VersionedCache
+from Constants import DEVICE_CONFIG_CACHE_SIZE, DEVICE_CONFIG_DEDUPLICATE
+from get_db import engine
 from models.deviceconfig import DeviceConfig
+from models.esp import Device
 from sqlalchemy.orm.attributes import flag_modified
 from sсhemas.config import ConfigUpdate
 from sсhemas.config import ConfigExport
 from sсhemas.config import ConfigImport
 from logger import logger
 
+# id пристрою -> config_data; інвалідується всіма шляхами запису конфігурацій
+config_cache = VersionedCache(maxsize=DEVICE_CONFIG_CACHE_SIZE)
+
 
 def get_device_config(db: Session, device_id: int) -> DeviceConfig:
     db_config = db.query(DeviceConfig).filter(DeviceConfig.device_id == device_id).first()
@@ -23,6 +32,39 @@ def get_device_config(db: Session, device_id: int) -> DeviceConfig:
     return db_config
 
 
+def get_config_data(db: Session, device_id: int) -> Dict:
+    config_data = config_cache.get(device_id)
+    if config_data is not None:
+        return config_data
+
+    version = config_cache.version(device_id)
+    config_data = db.query(DeviceConfig.config_data).filter(DeviceConfig.device_id == device_id).scalar()
+    if config_data is None:
+        raise ValueError(f"Конфігурацію для пристрою з id {device_id} не знайдено")
+    config_cache.set_if_current(device_id, config_data, version)
+    return config_data
+
+
+def get_configs_data(db: Session, device_ids: List[int]) -> Dict[int, Dict]:
+    configs = {}
+    versions = {}
+    for device_id in set(device_ids):
+        config_data = config_cache.get(device_id)
+        if config_data is None:
+            versions[device_id] = config_cache.version(device_id)
+        else:
+            configs[device_id] = config_data
+
+    if versions:
+        rows = db.query(DeviceConfig.device_id, DeviceConfig.config_data).filter(
+            DeviceConfig.device_id.in_(versions.keys())
+        ).all()
+        for device_id, config_data in rows:
+            config_cache.set_if_current(device_id, config_data, versions[device_id])
+            configs[device_id] = config_data
+    return configs
+
+
 def update_config_data(config_data: dict, update_data: dict) -> dict:
     if config_data is None:
         config_data = {}
@@ -41,6 +83,7 @@ def save_config(db: Session, db_config: DeviceConfig):
     db.add(db_config)
     try:
         db.commit()
+        config_cache.invalidate(db_config.device_id)
         db.refresh(db_config)
     except SQLAlchemyError:
         db.rollback()
@@ -48,36 +91,87 @@ def save_config(db: Session, db_config: DeviceConfig):
 
 
 
-def import_config(db: Session, data: Dict[str, Any], device_id: Optional[int] = None) -> int:
+def deduplicate_device_configs() -> None:
+    # Унікальний індекс на device_id не створиться, поки в старій БД є кілька конфігурацій
+    # одного пристрою. Без DEVICE_CONFIG_DEDUPLICATE додаток не запускається і повідомляє про конфлікти;
+    # з ним для кожного пристрою залишається остання збережена конфігурація
+    if not inspect(engine).has_table(DeviceConfig.__tablename__):
+        return
+    with engine.begin() as connection:
+        duplicates = connection.execute(text(
+            "SELECT device_id, array_agg(id ORDER BY id) FROM device_configs "
+            "GROUP BY device_id HAVING count(*) > 1 ORDER BY device_id"
+        )).all()
+        if not duplicates:
+            return
+        conflicts = ", ".join(f"пристрій {device_id}: конфігурації {config_ids}" for device_id, config_ids in duplicates)
+        if not DEVICE_CONFIG_DEDUPLICATE:
+            logger.error(f"Знайдено кілька конфігурацій для одного пристрою ({conflicts})")
+            raise RuntimeError("Кілька конфігурацій для одного пристрою: видаліть зайві вручну або увімкніть "
+                               "DEVICE_CONFIG_DEDUPLICATE, щоб залишити останню збережену")
+
+        removed_ids = [config_id for _, config_ids in duplicates for config_id in config_ids[:-1]]
+        connection.execute(delete(DeviceConfig).where(DeviceConfig.id.in_(removed_ids)))
+    for device_id, config_ids in duplicates:
+        logger.warning(f"Пристрій {device_id}: залишено конфігурацію {config_ids[-1]}, "
+                       f"видалено {config_ids[:-1]}")
+    logger.info(f"Видалено {len(removed_ids)} дублікатів конфігурацій пристроїв")
+
+
+def upsert_configs(db: Session, configs: Dict[int, Dict]) -> None:
+    stmt = pg_insert(DeviceConfig).values([
+        {"device_id": device_id, "config_data": config_data} for device_id, config_data in configs.items()
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[DeviceConfig.device_id], set_={"config_data": stmt.excluded.config_data}
+    ))
+    db.commit()
+    for device_id in configs:
+        config_cache.invalidate(device_id)
+
+
+def validate_import(db: Session, data: Dict[str, Any]) -> Tuple[Dict[int, Dict], Dict[str, str]]:
+    configs = {}
+    errors = {}
+    for key, config_data in data.items():
+        if not (isinstance(key, str) and key.isdigit()):
+            errors[str(key)] = "Ключ повинен бути числовим ідентифікатором пристрою"
+            continue
+        if not isinstance(config_data, dict):
+            errors[key] = "Конфігурація повинна бути словником"
+            continue
+        try:
+            configs[int(key)] = ConfigImport(**config_data).dict()
+        except ValidationError as e:
+            errors[key] = str(e)
+
+    # Без цієї перевірки один невідомий пристрій зірвав би весь INSERT на зовнішньому ключі
+    existing = set(db.execute(select(Device.id).where(Device.id.in_(configs.keys()))).scalars())
+    for device_id in [device_id for device_id in configs if device_id not in existing]:
+        errors[str(device_id)] = f"Пристрій з ідентифікатором {device_id} не знайдено"
+        del configs[device_id]
+    return configs, errors
+
+
+def import_config(db: Session, data: Dict[str, Any], device_id: Optional[int] = None) -> Dict[str, Any]:
     if device_id is not None:
         # Імпорт для конкретного пристрою
         if not isinstance(data, dict):
             raise ValueError("Для імпорту конфігурації конкретного пристрою дані повинні бути словником")
         config = ConfigImport(**data)
-        db_config = db.query(DeviceConfig).filter(DeviceConfig.device_id == device_id).first()
-        if db_config:
-            db_config.config_data = config.dict()
-        else:
-            db_config = DeviceConfig(device_id=device_id, config_data=config.dict())
-            db.add(db_config)
-        db.commit()
-        return 1
-    else:
-        # Імпорт всього файлу
-        if not isinstance(data, dict) or not all(isinstance(k, str) and k.isdigit() for k in data.keys()):
-            raise ValueError("Для імпорту всіх конфігурацій дані повинні бути словником з числовими ключами")
-        imported_count = 0
-        for dev_id, config_data in data.items():
-            config = ConfigImport(**config_data)
-            db_config = db.query(DeviceConfig).filter(DeviceConfig.device_id == int(dev_id)).first()
-            if db_config:
-                db_config.config_data = config.dict()
-            else:
-                db_config = DeviceConfig(device_id=int(dev_id), config_data=config.dict())
-                db.add(db_config)
-            imported_count += 1
-        db.commit()
-        return imported_count
+        if db.get(Device, device_id) is None:
+            raise ValueError(f"Пристрій з ідентифікатором {device_id} не знайдено")
+        upsert_configs(db, {device_id: config.dict()})
+        return {"imported": [device_id], "errors": {}}
+
+    # Імпорт всього файлу: спочатку перевіряються всі записи, потім коректні пишуться одним upsert,
+    # а помилки повертаються по кожному запису окремо
+    if not isinstance(data, dict):
+        raise ValueError("Для імпорту всіх конфігурацій дані повинні бути словником з числовими ключами")
+    configs, errors = validate_import(db, data)
+    if configs:
+        upsert_configs(db, configs)
+    return {"imported": sorted(configs), "errors": errors}
 
 
 def export_config(db: Session, device_id: Optional[int] = None) -> Union[Dict[str, ConfigExport], ConfigExport]:
@@ -1,27 +1,22 @@
-import json
-from typing import List, Dict
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Any
 
 from fastapi import HTTPException
+from sqlalchemy import func, select, true, tuple_
 from sqlalchemy.orm import Session, joinedload
 
+from cache import VersionedCache
+from Constants import DEVICE_ID_CACHE_SIZE
 from models.esp import Device
 from models.measurement import Measurement
+from models.measurement_hourly import MeasurementHourly
+from services import live_service
+from services.statistics_cache import statistics_cache
 from sсhemas.device import DeviceCreate, DeviceRead
 
-
-def export_measurements(db: Session) -> List[Dict]:
-    measurements = db.query(Measurement).all()
-    measurement_data = []
-    for measurement in measurements:
-        measurement_data.append({
-            "id": measurement.id,
-            "device_id": measurement.device_id,
-            "timestamp": measurement.timestamp.isoformat(),
-            "temperature": measurement.temperature,
-            "humidity": measurement.humidity,
-            "co2": measurement.co2
-        })
-    return measurement_data
+# MAC-адреса -> id пристрою для гарячого шляху прийому вимірювань; інвалідується при створенні
+# та видаленні пристроїв
+device_id_cache = VersionedCache(maxsize=DEVICE_ID_CACHE_SIZE)
 
 
 def create_device(db: Session, device: DeviceCreate):
@@ -32,13 +27,19 @@ def create_device(db: Session, device: DeviceCreate):
     db.add(new_device)
     db.commit()
     db.refresh(new_device)
+    device_id_cache.invalidate(new_device.mac_address)
 
 
 def delete_device_by_mac(db: Session, mac_address: str):
     device = db.query(Device).filter(Device.mac_address == mac_address).first()
     if device:
+        device_id = device.id
         db.delete(device)
         db.commit()
+        device_id_cache.invalidate(mac_address)
+        live_service.forget_devices([device_id])
+        live_service.invalidate_rooms()
+        statistics_cache.clear()
     else:
         raise ValueError(f"Пристрій з mac-адресою '{mac_address}' не знайдено")
 
@@ -53,6 +54,37 @@ def get_device_by_mac(db: Session, mac_address: str):
     return DeviceRead.from_orm(device)
 
 
+def resolve_device_id(db: Session, mac_address: str) -> int:
+    device_id = device_id_cache.get(mac_address)
+    if device_id is None:
+        # Версія береться до запиту: якщо пристрій видалять під час нього, старий id не потрапить у кеш
+        version = device_id_cache.version(mac_address)
+        device_id = db.query(Device.id).filter(Device.mac_address == mac_address).scalar()
+        if device_id is None:
+            raise ValueError(f"Пристрій з mac-адресою '{mac_address}' не знайдено")
+        device_id_cache.set_if_current(mac_address, device_id, version)
+    return device_id
+
+
+def resolve_device_ids(db: Session, mac_addresses: Iterable[str]) -> Dict[str, int]:
+    device_ids = {}
+    missing = set()
+    for mac_address in set(mac_addresses):
+        device_id = device_id_cache.get(mac_address)
+        if device_id is None:
+            missing.add(mac_address)
+        else:
+            device_ids[mac_address] = device_id
+
+    if missing:
+        versions = {mac_address: device_id_cache.version(mac_address) for mac_address in missing}
+        rows = db.query(Device.mac_address, Device.id).filter(Device.mac_address.in_(missing)).all()
+        for mac_address, device_id in rows:
+            device_id_cache.set_if_current(mac_address, device_id, versions[mac_address])
+            device_ids[mac_address] = device_id
+    return device_ids
+
+
 def get_all_devices(db: Session):
     devices = db.query(Device).options(
         joinedload(Device.measurements),
@@ -61,3 +93,80 @@ def get_all_devices(db: Session):
     if not devices:
         raise ValueError("Пристроїв не існує")
     return [DeviceRead.from_orm(device) for device in devices]
+
+
+def latest_measurement_lateral(device_id_column=Device.id):
+    # Останнє вимірювання пристрою через індекс (device_id, timestamp DESC)
+    return select(
+        Measurement.timestamp, Measurement.temperature, Measurement.humidity,
+        Measurement.co2, Measurement.productivity
+    ).where(Measurement.device_id == device_id_column).order_by(Measurement.timestamp.desc()).limit(1).lateral("latest")
+
+
+def measurement_totals_lateral(device_id_column=Device.id):
+    # Кількість вимірювань і час останнього беруться з погодинних агрегатів, а не з сирих рядків
+    return select(
+        func.coalesce(func.sum(MeasurementHourly.count), 0).label("measurement_count"),
+        func.max(MeasurementHourly.last_timestamp).label("last_seen")
+    ).where(MeasurementHourly.device_id == device_id_column).lateral("totals")
+
+
+def get_device_summaries(db: Session, limit: int, after_id: Optional[int] = None,
+                         room_id: Optional[int] = None) -> Dict[str, Any]:
+    latest = latest_measurement_lateral()
+    totals = measurement_totals_lateral()
+    query = select(
+        Device.id, Device.mac_address, Device.room_id,
+        totals.c.measurement_count, totals.c.last_seen,
+        latest.c.timestamp, latest.c.temperature, latest.c.humidity, latest.c.co2, latest.c.productivity
+    ).select_from(Device).join(totals, true()).outerjoin(latest, true())
+    if room_id is not None:
+        query = query.where(Device.room_id == room_id)
+    if after_id is not None:
+        query = query.where(Device.id > after_id)
+
+    # Зайвий рядок показує, чи є наступна сторінка
+    rows = db.execute(query.order_by(Device.id).limit(limit + 1)).mappings().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = []
+    for row in rows:
+        latest_reading = None
+        if row["timestamp"] is not None:
+            latest_reading = {field: row[field] for field in live_service.READING_FIELDS}
+        items.append({
+            "id": row["id"],
+            "mac_address": row["mac_address"],
+            "room_id": row["room_id"],
+            "measurement_count": row["measurement_count"],
+            "last_seen": row["last_seen"],
+            "latest": latest_reading
+        })
+    return {"items": items, "next_after_id": items[-1]["id"] if has_more else None}
+
+
+def get_device_measurements(db: Session, mac_address: str, limit: int,
+                            before_timestamp: Optional[datetime] = None,
+                            before_id: Optional[int] = None) -> Dict[str, Any]:
+    # Курсор - це пара (час, id) останнього вимірювання сторінки; сам id не задає позицію в порядку за часом
+    if before_id is not None and before_timestamp is None:
+        raise HTTPException(400, "Параметр before_id потребує before_timestamp")
+    device_id = resolve_device_id(db, mac_address)
+    query = db.query(
+        Measurement.id, Measurement.temperature, Measurement.humidity, Measurement.co2,
+        Measurement.productivity, Measurement.timestamp
+    ).filter(Measurement.device_id == device_id)
+    if before_timestamp is not None and before_id is not None:
+        query = query.filter(tuple_(Measurement.timestamp, Measurement.id) < tuple_(before_timestamp, before_id))
+    elif before_timestamp is not None:
+        query = query.filter(Measurement.timestamp < before_timestamp)
+
+    rows = query.order_by(Measurement.timestamp.desc(), Measurement.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    items = [dict(row._mapping) for row in rows[:limit]]
+    return {
+        "items": items,
+        "next_before_timestamp": items[-1]["timestamp"] if has_more else None,
+        "next_before_id": items[-1]["id"] if has_more else None
+    }
@@ -0,0 +1,201 @@
+import csv
+import io
+import zlib
+from datetime import datetime
+from typing import Iterator, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from Constants import EXPORT_CHUNK_SIZE
+from get_db import SessionLocal
+from models.esp import Device
+from models.measurement import Measurement
+from responses import dumps_json
+
+EXPORT_COLUMNS = ("id", "device_id", "timestamp", "temperature", "humidity", "co2")
+
+EXPORT_MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream"
+}
+
+COLUMNAR_FORMATS = ("parquet", "arrow")
+
+
+def iter_measurement_chunks(db: Session, device_id: Optional[int] = None, room_id: Optional[int] = None,
+                            time_from: Optional[datetime] = None, time_to: Optional[datetime] = None,
+                            chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[Sequence]:
+    query = select(*(getattr(Measurement, column) for column in EXPORT_COLUMNS))
+    if device_id is not None:
+        query = query.where(Measurement.device_id == device_id)
+    if room_id is not None:
+        query = query.join(Device, Device.id == Measurement.device_id).where(Device.room_id == room_id)
+    if time_from is not None:
+        query = query.where(Measurement.timestamp >= time_from)
+    if time_to is not None:
+        query = query.where(Measurement.timestamp <= time_to)
+    query = query.order_by(Measurement.id)
+
+    # stream_results відкриває серверний курсор: у пам'яті лише поточна порція рядків
+    result = db.execute(query.execution_options(stream_results=True, max_row_buffer=chunk_size))
+    yield from result.partitions(chunk_size)
+
+
+def _row_to_dict(row) -> dict:
+    data = dict(zip(EXPORT_COLUMNS, row))
+    data["timestamp"] = data["timestamp"].isoformat() if data["timestamp"] else None
+    return data
+
+
+def encode_json_chunks(chunks: Iterator[Sequence]) -> Iterator[bytes]:
+    yield b"["
+    first = True
+    for chunk in chunks:
+        encoded = b",".join(dumps_json(dict(zip(EXPORT_COLUMNS, row))) for row in chunk)
+        if not encoded:
+            continue
+        yield encoded if first else b"," + encoded
+        first = False
+    yield b"]"
+
+
+def encode_ndjson_chunks(chunks: Iterator[Sequence]) -> Iterator[bytes]:
+    for chunk in chunks:
+        yield b"".join(dumps_json(dict(zip(EXPORT_COLUMNS, row))) + b"\n" for row in chunk)
+
+
+def encode_csv_chunks(chunks: Iterator[Sequence]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for chunk in chunks:
+        writer.writerows(_row_to_dict(row).values() for row in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def columnar_export_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _ChunkSink:
+    # Файлоподібний приймач для pyarrow: записане забирається після кожної групи рядків
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _arrow_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("id", pa.int64()),
+        ("device_id", pa.int32()),
+        ("timestamp", pa.timestamp("us")),
+        ("temperature", pa.float64()),
+        ("humidity", pa.float64()),
+        ("co2", pa.float64())
+    ])
+
+
+def _chunk_to_table(chunk: Sequence, schema):
+    import pyarrow as pa
+    columns = list(zip(*chunk))
+    return pa.Table.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+        schema=schema
+    )
+
+
+def encode_parquet_chunks(chunks: Iterator[Sequence]) -> Iterator[bytes]:
+    import pyarrow.parquet as pq
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        for chunk in chunks:
+            if chunk:
+                # Кожна порція з БД стає окремою групою рядків Parquet
+                writer.write_table(_chunk_to_table(chunk, schema), row_group_size=len(chunk))
+                yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def encode_arrow_chunks(chunks: Iterator[Sequence]) -> Iterator[bytes]:
+    import pyarrow as pa
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(sink, schema)
+    try:
+        for chunk in chunks:
+            if chunk:
+                writer.write_table(_chunk_to_table(chunk, schema))
+                yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {
+    "json": encode_json_chunks,
+    "ndjson": encode_ndjson_chunks,
+    "csv": encode_csv_chunks,
+    "parquet": encode_parquet_chunks,
+    "arrow": encode_arrow_chunks
+}
+
+
+def stream_measurements(export_format: str, compress: bool = False, **filters) -> Iterator[bytes]:
+    # Сесія належить генератору: залежність get_db закривається ще до початку стрімінгу відповіді
+    db = SessionLocal()
+    try:
+        compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if compress else None
+        for encoded in ENCODERS[export_format](iter_measurement_chunks(db, **filters)):
+            data = encoded.encode("utf-8") if isinstance(encoded, str) else encoded
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                yield data
+        if compressor:
+            yield compressor.flush()
+    finally:
+        db.close()
+
+
+def export_filename(export_format: str, compress: bool = False) -> str:
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"measurements_{timestamp}.{export_format}"
+    return filename + ".gz" if compress else filename
@@ -0,0 +1,220 @@
+import csv
+import io
+import threading
+import time
+import traceback
+from collections import deque, Counter
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from Constants import INGEST_WRITE_BEHIND, INGEST_DURABILITY, INGEST_SYNCHRONOUS_COMMIT, INGEST_QUEUE_SIZE, \
+    INGEST_FLUSH_ROWS, INGEST_FLUSH_INTERVAL_MS, INGEST_ENQUEUE_TIMEOUT_MS, INGEST_FLUSH_RETRIES, \
+    INGEST_DRAIN_TIMEOUT
+from get_db import SessionLocal
+from logger import logger
+from models.measurement import Measurement
+from services import rollup_service, live_service
+from services.statistics_cache import statistics_cache
+
+COPY_COLUMNS = ("device_id", "timestamp", "temperature", "humidity", "co2", "productivity")
+
+# memory: відповідь повертається одразу, незаписані вимірювання втрачаються при аварійному завершенні;
+# commit: запит чекає, доки його пакет буде зафіксовано (групова фіксація)
+DURABILITY_MODES = ("memory", "commit")
+
+
+class IngestBufferFull(Exception):
+    pass
+
+
+class _Ticket:
+    # Очікування фіксації для режиму commit: один квиток на виклик submit
+    def __init__(self, pending: int):
+        self.pending = pending
+        self.error: Optional[Exception] = None
+        self._event = threading.Event()
+
+    def complete(self, rows: int, error: Optional[Exception] = None) -> None:
+        if error is not None:
+            self.error = error
+        self.pending -= rows
+        if self.pending <= 0:
+            self._event.set()
+
+    def wait(self) -> None:
+        self._event.wait()
+        if self.error is not None:
+            raise self.error
+
+
+def copy_measurements(db: Session, rows: List[Dict[str, Any]]) -> None:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        # Порожнє значення без лапок у форматі CSV команда COPY сприймає як NULL
+        writer.writerow("" if row.get(column) is None else row[column] for column in COPY_COLUMNS)
+    buffer.seek(0)
+
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {Measurement.__tablename__} ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+
+class IngestBuffer:
+    def __init__(self, capacity: int = INGEST_QUEUE_SIZE, flush_rows: int = INGEST_FLUSH_ROWS,
+                 flush_interval_ms: int = INGEST_FLUSH_INTERVAL_MS, durability: str = INGEST_DURABILITY,
+                 enqueue_timeout_ms: int = INGEST_ENQUEUE_TIMEOUT_MS, retries: int = INGEST_FLUSH_RETRIES,
+                 synchronous_commit: bool = INGEST_SYNCHRONOUS_COMMIT):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Невідомий режим надійності запису: {durability}")
+        self.capacity = capacity
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval_ms / 1000
+        self.durability = durability
+        self.enqueue_timeout = enqueue_timeout_ms / 1000
+        self.retries = retries
+        self.synchronous_commit = synchronous_commit
+
+        self._rows = deque()
+        self._condition = threading.Condition()
+        # Буфер приймає вимірювання лише між start() при запуску додатку та stop() при завершенні
+        self._closed = True
+        self._thread: Optional[threading.Thread] = None
+        self.flushed_rows = 0
+        self.dropped_rows = 0
+
+    def start(self) -> None:
+        with self._condition:
+            if self._thread is None:
+                self._closed = False
+                self._thread = threading.Thread(target=self._run, name="ingest-flusher", daemon=True)
+                self._thread.start()
+
+    def submit(self, rows: List[Dict[str, Any]]) -> None:
+        ticket = _Ticket(len(rows)) if self.durability == "commit" else None
+        deadline = time.monotonic() + self.enqueue_timeout
+        with self._condition:
+            # Зворотний тиск: чекаємо на місце в буфері, а не накопичуємо вимірювання без меж
+            while not self._closed and self._rows and len(self._rows) + len(rows) > self.capacity:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise IngestBufferFull("Буфер прийому вимірювань переповнений, повторіть запит пізніше")
+                self._condition.wait(remaining)
+            if self._closed:
+                raise IngestBufferFull("Прийом вимірювань зупинено")
+            self._rows.extend((row, ticket) for row in rows)
+            self._condition.notify_all()
+
+        if ticket is not None:
+            ticket.wait()
+
+    def stop(self, timeout: float = INGEST_DRAIN_TIMEOUT) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+            if thread.is_alive():
+                # Потік залишається зареєстрованим, тож start() не запустить другий паралельно з ним
+                logger.error(f"Буфер прийому не встиг записати {len(self._rows)} вимірювань за {timeout} с")
+                return
+        with self._condition:
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                "queued": len(self._rows),
+                "capacity": self.capacity,
+                "durability": self.durability,
+                "flushed": self.flushed_rows,
+                "dropped": self.dropped_rows
+            }
+
+    def _take_batch(self) -> List:
+        with self._condition:
+            while not self._rows and not self._closed:
+                self._condition.wait()
+            # Пакет закривається після flush_rows вимірювань або flush_interval від першого з них.
+            # У режимі commit на вимірювання чекають запити, тож пишемо все, що накопичилось
+            # за час попереднього запису (групова фіксація), а також не тримаємо повний буфер
+            deadline = time.monotonic() + (0 if self.durability == "commit" else self.flush_interval)
+            while len(self._rows) < min(self.flush_rows, self.capacity) and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch = [self._rows.popleft() for _ in range(min(self.flush_rows, len(self._rows)))]
+            self._condition.notify_all()
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                if self._closed:
+                    return
+                continue
+            self._flush(batch)
+
+    def _flush(self, batch: List) -> None:
+        rows = [row for row, _ in batch]
+        tickets = Counter(ticket for _, ticket in batch if ticket is not None)
+        error = None
+        for attempt in range(self.retries + 1):
+            try:
+                write_measurements(rows, self.synchronous_commit)
+                self.flushed_rows += len(rows)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                logger.error(f"Помилка запису пакета з {len(rows)} вимірювань (спроба {attempt + 1}): {str(e)}")
+                logger.error(traceback.format_exc())
+                time.sleep(min(0.1 * 2 ** attempt, 5))
+
+        if error is not None:
+            self.dropped_rows += len(rows)
+            logger.error(f"Пакет з {len(rows)} вимірювань відкинуто після {self.retries + 1} спроб")
+        for ticket, count in tickets.items():
+            ticket.complete(count, error)
+
+
+def write_measurements(rows: List[Dict[str, Any]], synchronous_commit: bool = True) -> None:
+    db = SessionLocal()
+    try:
+        if not synchronous_commit:
+            # Postgres підтверджує фіксацію до запису WAL на диск: при збої сервера БД
+            # можуть зникнути останні пакети, але не порушиться цілісність
+            db.execute(text("SET LOCAL synchronous_commit = off"))
+        copy_measurements(db, rows)
+        rollup_service.upsert_hourly(db, rows)
+        db.commit()
+        live_service.record_measurements(rows)
+        statistics_cache.record_measurements(rows)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+ingest_buffer = IngestBuffer() if INGEST_WRITE_BEHIND else None
+
+
+def start_ingest_buffer() -> None:
+    if ingest_buffer is not None:
+        ingest_buffer.start()
+
+
+def stop_ingest_buffer() -> None:
+    if ingest_buffer is not None:
+        ingest_buffer.stop()
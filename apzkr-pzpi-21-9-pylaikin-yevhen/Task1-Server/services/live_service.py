@@ -0,0 +1,184 @@
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from Constants import LIVE_SUBSCRIBER_BUFFER, LIVE_HEARTBEAT_SECONDS
+from get_db import SessionLocal
+from models.esp import Device
+from responses import dumps_json
+
+READING_FIELDS = ("timestamp", "temperature", "humidity", "co2", "productivity")
+
+# id пристрою -> останнє вимірювання; None означає, що в БД вимірювань ще немає
+latest_readings: Dict[int, Optional[Dict[str, Any]]] = {}
+# id кімнати -> {id пристрою: MAC-адреса}
+room_devices: Dict[int, Dict[int, str]] = {}
+# id пристрою -> id кімнати для кімнат, що вже є в індексі
+device_rooms: Dict[int, int] = {}
+# id кімнати -> підписники живої стрічки
+subscribers: Dict[int, Set["LiveSubscriber"]] = {}
+
+_lock = threading.Lock()
+
+
+class LiveSubscriber:
+    # Черга належить циклу подій з'єднання; публікація з потоків прийому йде через call_soon_threadsafe
+    def __init__(self, room_id: int, loop: asyncio.AbstractEventLoop, maxsize: int = LIVE_SUBSCRIBER_BUFFER):
+        self.room_id = room_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.dropped = False
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Повільний споживач відключається замість того, щоб накопичувати події без меж
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def next_event(self, timeout: float) -> Optional[Dict[str, Any]]:
+        # None означає, що підписника відключено; TimeoutError - що подій не було
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+async def iter_live_events(subscriber: LiveSubscriber,
+                           heartbeat: float = LIVE_HEARTBEAT_SECONDS) -> AsyncIterator[Tuple[str, Any]]:
+    while True:
+        try:
+            event = await subscriber.next_event(heartbeat)
+        except asyncio.TimeoutError:
+            yield "ping", None
+            continue
+        if event is None:
+            yield "dropped", {"reason": "Клієнт не встигає отримувати вимірювання"}
+            return
+        yield "measurement", event
+
+
+def format_sse(event_type: str, data: Any) -> str:
+    return f"event: {event_type}\ndata: {dumps_json(data).decode()}\n\n"
+
+
+async def sse_stream(subscriber: LiveSubscriber, snapshot: Dict[str, Any]) -> AsyncIterator[str]:
+    try:
+        yield format_sse("snapshot", snapshot)
+        async for event_type, data in iter_live_events(subscriber):
+            # Коментар SSE тримає з'єднання відкритим через проксі
+            yield ": ping\n\n" if event_type == "ping" else format_sse(event_type, data)
+    finally:
+        unsubscribe(subscriber)
+
+
+def _reading(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: row[field] for field in READING_FIELDS}
+
+
+def record_measurements(rows: Iterable[Dict[str, Any]]) -> None:
+    deliveries = []
+    with _lock:
+        for row in rows:
+            current = latest_readings.get(row["device_id"])
+            if current is None or row["timestamp"] >= current["timestamp"]:
+                latest_readings[row["device_id"]] = _reading(row)
+
+            room_id = device_rooms.get(row["device_id"])
+            if room_id is None or not subscribers.get(room_id):
+                continue
+            event = {
+                "room_id": room_id,
+                "device_id": row["device_id"],
+                "mac_address": room_devices[room_id].get(row["device_id"]),
+                **_reading(row)
+            }
+            deliveries.extend((subscriber, event) for subscriber in subscribers[room_id])
+
+    for subscriber, event in deliveries:
+        try:
+            subscriber.loop.call_soon_threadsafe(subscriber.offer, event)
+        except RuntimeError:
+            # Цикл подій з'єднання вже закрито
+            unsubscribe(subscriber)
+
+
+def subscribe(subscriber: LiveSubscriber) -> None:
+    with _lock:
+        subscribers.setdefault(subscriber.room_id, set()).add(subscriber)
+
+
+def unsubscribe(subscriber: LiveSubscriber) -> None:
+    with _lock:
+        room_subscribers = subscribers.get(subscriber.room_id)
+        if room_subscribers is not None:
+            room_subscribers.discard(subscriber)
+            if not room_subscribers:
+                del subscribers[subscriber.room_id]
+
+
+def get_latest_readings(device_ids: Iterable[int]) -> Tuple[Dict[int, Optional[Dict[str, Any]]], List[int]]:
+    found = {}
+    missing = []
+    with _lock:
+        for device_id in device_ids:
+            if device_id in latest_readings:
+                found[device_id] = latest_readings[device_id]
+            else:
+                missing.append(device_id)
+    return found, missing
+
+
+def store_latest_readings(readings: Dict[int, Optional[Dict[str, Any]]]) -> None:
+    # Значення з БД не повинні перезаписати свіжіше вимірювання, яке прийшло паралельно
+    with _lock:
+        for device_id, row in readings.items():
+            if latest_readings.get(device_id) is None:
+                latest_readings[device_id] = _reading(row) if row is not None else None
+
+
+def forget_devices(device_ids: Iterable[int]) -> None:
+    with _lock:
+        for device_id in device_ids:
+            latest_readings.pop(device_id, None)
+
+
+def get_room_devices(db: Session, room_id: int) -> Dict[int, str]:
+    with _lock:
+        devices = room_devices.get(room_id)
+    if devices is None:
+        devices = dict(db.query(Device.id, Device.mac_address).filter(Device.room_id == room_id).all())
+        with _lock:
+            room_devices[room_id] = devices
+            for device_id in devices:
+                device_rooms[device_id] = room_id
+    return devices
+
+
+def invalidate_rooms() -> None:
+    with _lock:
+        room_devices.clear()
+        device_rooms.clear()
+        subscribed_rooms = list(subscribers.keys())
+
+    # Кімнати з активними підписниками одразу завантажуються знову, щоб стрічка не переривалась
+    if subscribed_rooms:
+        db = SessionLocal()
+        try:
+            for room_id in subscribed_rooms:
+                get_room_devices(db, room_id)
+        finally:
+            db.close()
+
+
+def stats() -> Dict[str, int]:
+    with _lock:
+        return {
+            "devices": sum(1 for reading in latest_readings.values() if reading is not None),
+            "rooms": len(room_devices),
+            "subscribers": sum(len(room_subscribers) for room_subscribers in subscribers.values())
+        }
@@ -0,0 +1,197 @@
+import asyncio
+import traceback
+from datetime import datetime
+from typing import List, Tuple
+
+from sqlalchemy import delete, func, inspect, select, text
+from sqlalchemy.orm import Session
+
+from Constants import MEASUREMENT_PARTITIONING, MEASUREMENT_PARTITION_MIGRATE, MEASUREMENT_PARTITIONS_AHEAD, \
+    MEASUREMENT_RETENTION_MONTHS, MEASUREMENT_RETENTION_MODE, PARTITION_MAINTENANCE_INTERVAL
+from get_db import SessionLocal
+from logger import logger
+from models.measurement import Measurement
+from models.measurement_hourly import MeasurementHourly
+from services import rollup_service
+from services.statistics_cache import statistics_cache
+
+PARENT_TABLE = Measurement.__tablename__
+LEGACY_TABLE = f"{PARENT_TABLE}_legacy"
+
+# Ключ advisory lock для створення, міграції та видалення секцій
+PARTITION_MAINTENANCE_LOCK = 7_301_002
+
+
+def month_start(timestamp: datetime) -> datetime:
+    return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(timestamp: datetime, months: int) -> datetime:
+    month_index = timestamp.year * 12 + timestamp.month - 1 + months
+    return timestamp.replace(year=month_index // 12, month=month_index % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def is_partitioned(db: Session) -> bool:
+    relkind = db.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"), {"table": PARENT_TABLE}
+    ).scalar()
+    return relkind == "p"
+
+
+def list_partitions(db: Session) -> List[Tuple[datetime, str]]:
+    names = db.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :table"
+    ), {"table": PARENT_TABLE}).scalars().all()
+
+    partitions = []
+    prefix = f"{PARENT_TABLE}_y"
+    for name in names:
+        # Секції, створені не цим сервісом, не чіпаємо
+        if not name.startswith(prefix) or len(name) != len(prefix) + 7:
+            continue
+        partitions.append((datetime(int(name[-7:-3]), int(name[-2:]), 1), name))
+    return sorted(partitions)
+
+
+def create_partition(db: Session, month: datetime) -> None:
+    db.execute(text(
+        f'CREATE TABLE IF NOT EXISTS "{partition_name(month)}" PARTITION OF "{PARENT_TABLE}" '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+
+
+def ensure_partitions(db: Session, since: datetime = None, months_ahead: int = MEASUREMENT_PARTITIONS_AHEAD) -> int:
+    current = month_start(since or datetime.utcnow())
+    last = add_months(month_start(datetime.utcnow()), months_ahead)
+    existing = {name for _, name in list_partitions(db)}
+    created = 0
+    while current <= last:
+        if partition_name(current) not in existing:
+            create_partition(db, current)
+            created += 1
+        current = add_months(current, 1)
+    return created
+
+
+def lock_maintenance(db: Session) -> None:
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_MAINTENANCE_LOCK})
+
+
+def apply_retention(db: Session, retention_months: int = MEASUREMENT_RETENTION_MONTHS,
+                    mode: str = MEASUREMENT_RETENTION_MODE) -> List[str]:
+    if retention_months <= 0:
+        return []
+    if mode not in ("downsample", "drop"):
+        raise ValueError(f"Невідомий режим зберігання вимірювань: {mode}")
+
+    cutoff = add_months(month_start(datetime.utcnow()), -retention_months)
+    dropped = []
+    for month, name in list_partitions(db):
+        month_end = add_months(month, 1)
+        if month_end > cutoff:
+            continue
+
+        lock_maintenance(db)
+        if mode == "downsample":
+            # Погодинні агрегати ведуться під час прийому; перед видаленням сирих даних
+            # переконуємось, що вони покривають усю секцію
+            raw_count = db.execute(text(f'SELECT count(*) FROM "{name}"')).scalar()
+            rollup_count = db.execute(
+                select(func.coalesce(func.sum(MeasurementHourly.count), 0)).where(
+                    MeasurementHourly.hour >= month, MeasurementHourly.hour < month_end
+                )
+            ).scalar()
+            if raw_count != rollup_count:
+                logger.info(f"Перебудова погодинних агрегатів для секції {name} перед видаленням")
+                rollup_service.rebuild_hourly(db, time_from=month, time_to=month_end)
+                lock_maintenance(db)
+        else:
+            db.execute(delete(MeasurementHourly).where(
+                MeasurementHourly.hour >= month, MeasurementHourly.hour < month_end
+            ))
+
+        db.execute(text(f'DROP TABLE "{name}"'))
+        db.commit()
+        dropped.append(name)
+        logger.info(f"Секцію вимірювань {name} видалено політикою зберігання ({mode})")
+    # Точна статистика за ці місяці читала сирі вимірювання, яких більше немає, в обох режимах
+    if dropped:
+        statistics_cache.clear()
+    return dropped
+
+
+def migrate_legacy_table(db: Session) -> None:
+    # Звичайну таблицю не можна перетворити на секціоновану: створюємо нову й переносимо рядки.
+    # Стара таблиця залишається як measurements_legacy, її можна видалити після перевірки
+    columns = ", ".join(f'"{column.name}"' for column in Measurement.__table__.columns)
+    sequence = db.execute(text(f"SELECT pg_get_serial_sequence('{PARENT_TABLE}', 'id')")).scalar()
+
+    db.execute(text(f'ALTER TABLE "{PARENT_TABLE}" RENAME TO "{LEGACY_TABLE}"'))
+    if sequence:
+        db.execute(text(f'ALTER SEQUENCE {sequence} RENAME TO "{LEGACY_TABLE}_id_seq"'))
+    for index in inspect(db.connection()).get_indexes(LEGACY_TABLE):
+        db.execute(text(f'ALTER INDEX "{index["name"]}" RENAME TO "{index["name"]}_legacy"'))
+    db.execute(text(f'ALTER TABLE "{LEGACY_TABLE}" RENAME CONSTRAINT "{PARENT_TABLE}_pkey" TO "{LEGACY_TABLE}_pkey"'))
+
+    Measurement.__table__.create(bind=db.connection())
+    oldest = db.execute(text(f'SELECT min(timestamp) FROM "{LEGACY_TABLE}"')).scalar()
+    ensure_partitions(db, since=oldest)
+
+    moved = db.execute(text(
+        f'INSERT INTO "{PARENT_TABLE}" ({columns}) SELECT {columns} FROM "{LEGACY_TABLE}" '
+        f"WHERE timestamp IS NOT NULL"
+    )).rowcount
+    db.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{PARENT_TABLE}', 'id'), "
+        f'(SELECT coalesce(max(id), 0) + 1 FROM "{LEGACY_TABLE}"), false)'
+    ))
+    logger.info(f"Перенесено {moved} вимірювань до секціонованої таблиці {PARENT_TABLE}")
+
+
+def maintain_partitions() -> None:
+    db = SessionLocal()
+    try:
+        lock_maintenance(db)
+        if not is_partitioned(db):
+            if not MEASUREMENT_PARTITION_MIGRATE:
+                logger.warning(f"Таблиця {PARENT_TABLE} не секціонована; "
+                               f"для перенесення даних увімкніть MEASUREMENT_PARTITION_MIGRATE")
+                db.commit()
+                return
+            migrate_legacy_table(db)
+
+        created = ensure_partitions(db)
+        db.commit()
+        if created:
+            logger.info(f"Створено секцій вимірювань: {created}")
+
+        apply_retention(db)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Помилка обслуговування секцій вимірювань: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise
+    finally:
+        db.close()
+
+
+def initialize_measurement_partitions() -> None:
+    if MEASUREMENT_PARTITIONING:
+        maintain_partitions()
+
+
+async def run_partition_maintenance() -> None:
+    while True:
+        await asyncio.sleep(PARTITION_MAINTENANCE_INTERVAL)
+        try:
+            await asyncio.to_thread(maintain_partitions)
+        except Exception:
+            # Помилку вже записано в журнал, наступна спроба буде через інтервал
+            continue
@@ -0,0 +1,67 @@
+import math
+from collections import Counter
+from typing import Dict, Iterable, List
+
+# Квантильний скетч з відносною похибкою (логарифмічні кошики, як у DDSketch): значення v > 0
+# потрапляє в кошик i = ceil(log_gamma(v)), а кошик представляє значення 2 * gamma^i / (gamma + 1),
+# що відрізняється від будь-якого значення кошика не більш ніж на SKETCH_RELATIVE_ACCURACY.
+# Тому медіана й квартилі зі скетчу відрізняються від точних (лінійна інтерполяція, як у pandas)
+# не більш ніж на 0.5% від модуля значення, а IQR - не більш ніж на 0.005 * (|Q1| + |Q3|).
+# Скетч - це словник {ключ кошика: кількість}; скетчі об'єднуються додаванням кількостей.
+# Точність входить у ключі, збережені в measurement_hourly, тож після її зміни агрегати треба перебудувати
+SKETCH_RELATIVE_ACCURACY = 0.005
+SKETCH_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+SKETCH_LOG_GAMMA = math.log(SKETCH_GAMMA)
+
+ZERO_KEY = "z"
+
+
+def sketch_key(value: float) -> str:
+    if value == 0:
+        return ZERO_KEY
+    index = math.ceil(math.log(abs(value)) / SKETCH_LOG_GAMMA)
+    return f"p{index}" if value > 0 else f"n{index}"
+
+
+def key_value(key: str) -> float:
+    if key == ZERO_KEY:
+        return 0.0
+    value = 2 * SKETCH_GAMMA ** int(key[1:]) / (SKETCH_GAMMA + 1)
+    return value if key[0] == "p" else -value
+
+
+def add_to_sketch(sketch: Dict[str, int], value: float) -> None:
+    key = sketch_key(value)
+    sketch[key] = sketch.get(key, 0) + 1
+
+
+def merge_sketches(sketches: Iterable[Dict[str, int]]) -> Counter:
+    merged = Counter()
+    for sketch in sketches:
+        merged.update(sketch)
+    return merged
+
+
+def sketch_quantiles(sketch: Dict[str, int], quantiles: List[float]) -> List[float]:
+    buckets = sorted((key_value(key), count) for key, count in sketch.items() if count > 0)
+    total = sum(count for _, count in buckets)
+    if not total:
+        return [math.nan] * len(quantiles)
+
+    def value_at(rank: int) -> float:
+        seen = 0
+        for value, count in buckets:
+            seen += count
+            if rank < seen:
+                return value
+        return buckets[-1][0]
+
+    results = []
+    for quantile in quantiles:
+        # Ранг (n - 1) * q з лінійною інтерполяцією між сусідніми порядковими статистиками
+        position = (total - 1) * quantile
+        lower = math.floor(position)
+        lower_value = value_at(lower)
+        upper_value = value_at(lower + 1) if position > lower else lower_value
+        results.append(lower_value + (position - lower) * (upper_value - lower_value))
+    return results
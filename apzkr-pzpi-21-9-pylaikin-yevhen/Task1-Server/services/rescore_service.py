@@ -0,0 +1,157 @@
+import threading
+import traceback
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Any
+
+import numpy as np
+from sqlalchemy import Integer, column, func, tuple_, update, values
+from sqlalchemy.orm import Session
+
+from Constants import RESCORE_CHUNK_SIZE
+from get_db import SessionLocal
+from logger import logger
+from models.esp import Device
+from models.measurement import Measurement
+from services import config_service, rollup_service, live_service
+from services.analytics_service import calculate_productivity_vectorized
+from services.statistics_cache import statistics_cache
+
+MAX_TRACKED_JOBS = 100
+
+rescore_jobs: OrderedDict = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+def get_room_device_ids(db: Session, room_id: int) -> List[int]:
+    device_ids = [device_id for device_id, in db.query(Device.id).filter(Device.room_id == room_id).all()]
+    if not device_ids:
+        raise ValueError(f"У кімнаті з id {room_id} немає пристроїв")
+    return device_ids
+
+
+def create_rescore_job(device_ids: List[int]) -> Dict[str, Any]:
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "device_ids": sorted(set(device_ids)),
+        "status": "pending",
+        "total": None,
+        "processed": 0,
+        "updated": 0,
+        # Пристрої без конфігурації пропускаються, а не зупиняють усе завдання
+        "skipped_device_ids": [],
+        "created_at": datetime.utcnow().isoformat(),
+        "finished_at": None,
+        "error": None
+    }
+    with _jobs_lock:
+        rescore_jobs[job["job_id"]] = job
+        while len(rescore_jobs) > MAX_TRACKED_JOBS:
+            rescore_jobs.popitem(last=False)
+    return dict(job)
+
+
+def get_rescore_job(job_id: str) -> Dict[str, Any]:
+    with _jobs_lock:
+        job = rescore_jobs.get(job_id)
+        if job is None:
+            raise ValueError(f"Завдання перерахунку {job_id} не знайдено")
+        return dict(job)
+
+
+def _update_job(job_id: str, **fields) -> None:
+    with _jobs_lock:
+        if job_id in rescore_jobs:
+            rescore_jobs[job_id].update(fields)
+
+
+def rescore_device(db: Session, device_id: int, config: Dict, chunk_size: int = RESCORE_CHUNK_SIZE,
+                   on_chunk=None) -> int:
+    updated = 0
+    last_key = None
+
+    # Keyset-пагінація по (timestamp, id) у порядку індексу ix_measurements_device_id_timestamp:
+    # кожна порція читається з індексу пристрою, а в пам'яті не більше chunk_size рядків.
+    # Вимірювання без timestamp не потрапляють ні в агрегати, ні в статистику, тож пропускаються
+    while True:
+        query = db.query(
+            Measurement.id, Measurement.timestamp, Measurement.temperature, Measurement.humidity, Measurement.co2
+        ).filter(Measurement.device_id == device_id, Measurement.timestamp.isnot(None))
+        if last_key is not None:
+            query = query.filter(
+                Measurement.timestamp <= last_key[0],
+                tuple_(Measurement.timestamp, Measurement.id) < tuple_(*last_key)
+            )
+        rows = query.order_by(Measurement.timestamp.desc(), Measurement.id.desc()).limit(chunk_size).all()
+        if not rows:
+            break
+
+        ids, timestamps, temperature, humidity, co2 = zip(*rows)
+        scores = calculate_productivity_vectorized(
+            np.array(temperature, dtype=np.float64),
+            np.array(humidity, dtype=np.float64),
+            np.array(co2, dtype=np.float64),
+            config
+        )
+
+        scored = values(
+            column("id", Integer), column("productivity", Integer), name="scored"
+        ).data(list(zip(ids, scores.tolist())))
+        result = db.execute(
+            update(Measurement)
+            .where(Measurement.id == scored.c.id)
+            .where(Measurement.productivity.is_distinct_from(scored.c.productivity))
+            .values(productivity=scored.c.productivity)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+
+        updated += result.rowcount
+        last_key = (timestamps[-1], ids[-1])
+        if on_chunk:
+            on_chunk(len(rows), result.rowcount)
+
+    if updated:
+        rollup_service.rebuild_hourly(db, [device_id])
+        live_service.forget_devices([device_id])
+        statistics_cache.clear()
+    return updated
+
+
+def run_rescore_job(job_id: str, chunk_size: int = RESCORE_CHUNK_SIZE) -> None:
+    job = get_rescore_job(job_id)
+    db = SessionLocal()
+    try:
+        configs = config_service.get_configs_data(db, job["device_ids"])
+        skipped = [device_id for device_id in job["device_ids"] if device_id not in configs]
+        if skipped:
+            logger.warning(f"Перерахунок продуктивності {job_id}: пропущено пристрої без конфігурації {skipped}")
+
+        total = db.query(func.count(Measurement.id)).filter(
+            Measurement.device_id.in_(list(configs)),
+            Measurement.timestamp.isnot(None)
+        ).scalar()
+        _update_job(job_id, status="running", total=total, skipped_device_ids=skipped)
+        logger.info(f"Перерахунок продуктивності {job_id}: {total} вимірювань")
+
+        progress = {"processed": 0, "updated": 0}
+
+        def on_chunk(processed: int, updated: int):
+            progress["processed"] += processed
+            progress["updated"] += updated
+            _update_job(job_id, **progress)
+
+        for device_id in job["device_ids"]:
+            if device_id in configs:
+                rescore_device(db, device_id, configs[device_id], chunk_size, on_chunk)
+
+        _update_job(job_id, status="completed", finished_at=datetime.utcnow().isoformat())
+        logger.info(f"Перерахунок продуктивності {job_id} завершено: оновлено {progress['updated']} вимірювань")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Помилка перерахунку продуктивності {job_id}: {str(e)}")
+        logger.error(traceback.format_exc())
+        _update_job(job_id, status="failed", error=str(e), finished_at=datetime.utcnow().isoformat())
+    finally:
+        db.close()
@@ -0,0 +1,286 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+import pandas as pd
+from sqlalchemy import Float, Integer, String, case, cast, delete, func, insert, literal_column, select, text, \
+    tuple_
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from get_db import SessionLocal
+from logger import logger
+from models.esp import Device
+from models.measurement import Measurement
+from models.measurement_hourly import MeasurementHourly
+from services.quantile_sketch import SKETCH_LOG_GAMMA, ZERO_KEY, add_to_sketch
+
+CHANNELS = ("temperature", "humidity", "co2", "productivity")
+MOMENTS = ("mean", "m2", "m3", "m4")
+
+# Ключ advisory lock: перебудова агрегатів бере його монопольно, запис вимірювань - спільно.
+# Так перебудова не перетинається з незафіксованими upsert тих самих годин, а записи між собою - ні
+ROLLUP_REBUILD_LOCK = 7_301_001
+
+
+def hour_bucket(timestamp: datetime) -> datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def hour_ceil(timestamp: datetime) -> datetime:
+    bucket = hour_bucket(timestamp)
+    return bucket if bucket == timestamp else bucket + timedelta(hours=1)
+
+
+def lock_rollups(db: Session, shared: bool = False) -> None:
+    function = "pg_advisory_xact_lock_shared" if shared else "pg_advisory_xact_lock"
+    db.execute(text(f"SELECT {function}(:key)"), {"key": ROLLUP_REBUILD_LOCK})
+
+
+def count_column(channel: str) -> str:
+    return "productivity_count" if channel == "productivity" else "count"
+
+
+def add_moments(bucket: Dict[str, Any], channel: str, value: float, count: int) -> None:
+    # Онлайн-оновлення центральних моментів до 4-го порядку (Welford, розширення Pébay);
+    # count - кількість значень каналу разом із поточним
+    mean = bucket[f"{channel}_mean"]
+    m2 = bucket[f"{channel}_m2"]
+    m3 = bucket[f"{channel}_m3"]
+    delta = value - mean
+    delta_n = delta / count
+    delta_n2 = delta_n * delta_n
+    term = delta * delta_n * (count - 1)
+
+    bucket[f"{channel}_mean"] = mean + delta_n
+    bucket[f"{channel}_m4"] += term * delta_n2 * (count * count - 3 * count + 3) + 6 * delta_n2 * m2 - 4 * delta_n * m3
+    bucket[f"{channel}_m3"] += term * delta_n * (count - 2) - 3 * delta_n * m2
+    bucket[f"{channel}_m2"] += term
+
+
+def merge_moments(channel: str, current, incoming) -> Dict[str, Any]:
+    # Об'єднання моментів двох наборів (Chan/Pébay) для ON CONFLICT DO UPDATE:
+    # праві частини SET бачать рядок до оновлення, тож усі колонки рахуються зі старих значень
+    n_a = cast(getattr(current, count_column(channel)), Float)
+    n_b = cast(getattr(incoming, count_column(channel)), Float)
+    n = n_a + n_b
+    mean_a, m2_a, m3_a, m4_a = (getattr(current, f"{channel}_{moment}") for moment in MOMENTS)
+    mean_b, m2_b, m3_b, m4_b = (getattr(incoming, f"{channel}_{moment}") for moment in MOMENTS)
+    delta = mean_b - mean_a
+
+    merged = {
+        "mean": mean_a + delta * n_b / n,
+        "m2": m2_a + m2_b + delta * delta * n_a * n_b / n,
+        "m3": m3_a + m3_b + delta * delta * delta * n_a * n_b * (n_a - n_b) / (n * n)
+              + 3 * delta * (n_a * m2_b - n_b * m2_a) / n,
+        "m4": m4_a + m4_b + delta * delta * delta * delta * n_a * n_b * (n_a * n_a - n_a * n_b + n_b * n_b) / (n * n * n)
+              + 6 * delta * delta * (n_a * n_a * m2_b + n_b * n_b * m2_a) / (n * n)
+              + 4 * delta * (n_a * m3_b - n_b * m3_a) / n
+    }
+    # Порожній канал (наприклад, продуктивність ще не рахувалась) просто приймає нові моменти
+    empty = getattr(current, count_column(channel)) == 0
+    return {
+        f"{channel}_{moment}": case((empty, getattr(incoming, f"{channel}_{moment}")), else_=value)
+        for moment, value in merged.items()
+    }
+
+
+def merge_sketch(channel: str):
+    # Скетчі об'єднуються додаванням кількостей за однаковими ключами кошиків
+    table = MeasurementHourly.__tablename__
+    column = f"{channel}_sketch"
+    return literal_column(
+        f"COALESCE((SELECT jsonb_object_agg(key, total) FROM (SELECT key, sum(value::bigint) AS total FROM ("
+        f"SELECT * FROM jsonb_each_text({table}.{column}) UNION ALL SELECT * FROM jsonb_each_text(excluded.{column})"
+        f") AS entries GROUP BY key) AS merged), '{{}}'::jsonb)",
+        type_=JSONB
+    )
+
+
+def sketch_key_sql(value):
+    # SQL-відповідник quantile_sketch.sketch_key
+    index = cast(cast(func.ceil(func.ln(func.abs(value)) / SKETCH_LOG_GAMMA), Integer), String)
+    return case((value == 0, ZERO_KEY), (value > 0, "p" + index), else_="n" + index)
+
+
+def aggregate_hourly(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    buckets = {}
+    for row in rows:
+        timestamp = row["timestamp"]
+        key = (row["device_id"], hour_bucket(timestamp))
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = {
+                "device_id": key[0],
+                "hour": key[1],
+                "count": 0,
+                "first_timestamp": timestamp,
+                "last_timestamp": timestamp,
+                "productivity_count": 0
+            }
+            for channel in CHANNELS:
+                bucket.update({f"{channel}_sum": 0.0, f"{channel}_sumsq": 0.0,
+                               f"{channel}_min": None, f"{channel}_max": None})
+                bucket.update({f"{channel}_{moment}": 0.0 for moment in MOMENTS})
+                bucket[f"{channel}_sketch"] = {}
+            buckets[key] = bucket
+
+        bucket["count"] += 1
+        bucket["first_timestamp"] = min(bucket["first_timestamp"], timestamp)
+        bucket["last_timestamp"] = max(bucket["last_timestamp"], timestamp)
+        for channel in CHANNELS:
+            value = row.get(channel)
+            if value is None:
+                continue
+            if channel == "productivity":
+                bucket["productivity_count"] += 1
+            bucket[f"{channel}_sum"] += value
+            bucket[f"{channel}_sumsq"] += value * value
+            current_min = bucket[f"{channel}_min"]
+            current_max = bucket[f"{channel}_max"]
+            bucket[f"{channel}_min"] = value if current_min is None else min(current_min, value)
+            bucket[f"{channel}_max"] = value if current_max is None else max(current_max, value)
+            add_moments(bucket, channel, value, bucket[count_column(channel)])
+            add_to_sketch(bucket[f"{channel}_sketch"], value)
+    return list(buckets.values())
+
+
+def upsert_hourly(db: Session, rows: Iterable[Dict[str, Any]]) -> None:
+    # Рядки блокуються в порядку VALUES: однаковий порядок (device_id, hour) у всіх пакетах
+    # не дає двом паралельним upsert тих самих годин заблокувати один одного
+    aggregates = sorted(aggregate_hourly(rows), key=lambda bucket: (bucket["device_id"], bucket["hour"]))
+    if not aggregates:
+        return
+
+    # Сирі вимірювання цієї транзакції перебудова не бачить, доки вона не зафіксується,
+    # тож їхній внесок додається після перебудови, а не губиться і не дублюється
+    lock_rollups(db, shared=True)
+    stmt = pg_insert(MeasurementHourly).values(aggregates)
+    excluded = stmt.excluded
+    hourly = MeasurementHourly
+    set_ = {
+        "count": hourly.count + excluded.count,
+        "first_timestamp": func.least(hourly.first_timestamp, excluded.first_timestamp),
+        "last_timestamp": func.greatest(hourly.last_timestamp, excluded.last_timestamp),
+        "productivity_count": hourly.productivity_count + excluded.productivity_count
+    }
+    for channel in CHANNELS:
+        set_[f"{channel}_sum"] = getattr(hourly, f"{channel}_sum") + getattr(excluded, f"{channel}_sum")
+        set_[f"{channel}_sumsq"] = getattr(hourly, f"{channel}_sumsq") + getattr(excluded, f"{channel}_sumsq")
+        set_[f"{channel}_min"] = func.least(getattr(hourly, f"{channel}_min"), getattr(excluded, f"{channel}_min"))
+        set_[f"{channel}_max"] = func.greatest(getattr(hourly, f"{channel}_max"),
+                                              getattr(excluded, f"{channel}_max"))
+        set_.update(merge_moments(channel, hourly, excluded))
+        set_[f"{channel}_sketch"] = merge_sketch(channel)
+
+    db.execute(stmt.on_conflict_do_update(index_elements=[hourly.device_id, hourly.hour], set_=set_))
+
+
+def rebuild_hourly(db: Session, device_ids: Optional[List[int]] = None,
+                   time_from: Optional[datetime] = None, time_to: Optional[datetime] = None) -> None:
+    # DELETE і INSERT ... SELECT нижче виконуються без паралельних upsert: інакше upsert нової години
+    # між ними призведе до порушення унікальності, а оновлення вже видаленої години загубиться
+    lock_rollups(db)
+    filters = []
+    if device_ids is not None:
+        filters.append(Measurement.device_id.in_(device_ids))
+    if time_from is not None:
+        filters.append(Measurement.timestamp >= time_from)
+    if time_to is not None:
+        filters.append(Measurement.timestamp < time_to)
+
+    # Два проходи: віконне середнє години, потім суми степенів відхилень від нього,
+    # що стійкіше за обчислення моментів через степеневі суми сирих значень
+    hour = func.date_trunc('hour', Measurement.timestamp)
+    rows = select(
+        Measurement.device_id, hour.label("hour"), Measurement.timestamp,
+        *[getattr(Measurement, channel) for channel in CHANNELS],
+        *[func.avg(getattr(Measurement, channel)).over(partition_by=(Measurement.device_id, hour))
+          .label(f"{channel}_hour_mean") for channel in CHANNELS],
+        *[sketch_key_sql(getattr(Measurement, channel)).label(f"{channel}_key") for channel in CHANNELS]
+    ).where(*filters).cte("hour_rows")
+
+    columns = {
+        "device_id": rows.c.device_id,
+        "hour": rows.c.hour,
+        "count": func.count(),
+        "first_timestamp": func.min(rows.c.timestamp),
+        "last_timestamp": func.max(rows.c.timestamp),
+        "productivity_count": func.count(rows.c.productivity)
+    }
+    for channel in CHANNELS:
+        value = rows.c[channel]
+        deviation = value - rows.c[f"{channel}_hour_mean"]
+        columns[f"{channel}_sum"] = func.coalesce(func.sum(value), 0.0)
+        columns[f"{channel}_sumsq"] = func.coalesce(func.sum(value * value), 0.0)
+        columns[f"{channel}_min"] = func.min(value)
+        columns[f"{channel}_max"] = func.max(value)
+        columns[f"{channel}_mean"] = func.coalesce(func.avg(value), 0.0)
+        columns[f"{channel}_m2"] = func.coalesce(func.sum(deviation * deviation), 0.0)
+        columns[f"{channel}_m3"] = func.coalesce(func.sum(deviation * deviation * deviation), 0.0)
+        columns[f"{channel}_m4"] = func.coalesce(func.sum(deviation * deviation * deviation * deviation), 0.0)
+    aggregates = select(*[column.label(name) for name, column in columns.items()]) \
+        .group_by(rows.c.device_id, rows.c.hour).subquery()
+
+    # Скетч години: кількість значень у кожному кошику, зібрана в jsonb
+    names = list(columns)
+    source_columns = [aggregates.c[name] for name in names]
+    joined = aggregates
+    for channel in CHANNELS:
+        key = rows.c[f"{channel}_key"]
+        keys = select(rows.c.device_id, rows.c.hour, key.label("key"), func.count().label("count")) \
+            .where(rows.c[channel].isnot(None)).group_by(rows.c.device_id, rows.c.hour, key).subquery()
+        sketches = select(keys.c.device_id, keys.c.hour, func.jsonb_object_agg(keys.c.key, keys.c.count).label("sketch")) \
+            .group_by(keys.c.device_id, keys.c.hour).subquery()
+        joined = joined.outerjoin(sketches, (sketches.c.device_id == aggregates.c.device_id)
+                                  & (sketches.c.hour == aggregates.c.hour))
+        source_columns.append(func.coalesce(sketches.c.sketch, literal_column("'{}'::jsonb")))
+        names.append(f"{channel}_sketch")
+    source = select(*source_columns).select_from(joined)
+
+    # Перебудовуються лише години, для яких є сирі вимірювання: агрегати за періоди,
+    # сирі дані яких уже видалено політикою зберігання, залишаються
+    rebuilt_hours = select(Measurement.device_id, hour).where(*filters).distinct()
+    db.execute(delete(MeasurementHourly).where(
+        tuple_(MeasurementHourly.device_id, MeasurementHourly.hour).in_(rebuilt_hours)
+    ))
+    db.execute(insert(MeasurementHourly).from_select(names, source))
+    db.commit()
+
+
+def initialize_hourly_rollup() -> None:
+    db = SessionLocal()
+    try:
+        lock_rollups(db)
+        has_rollups = db.query(MeasurementHourly.device_id).first() is not None
+        has_measurements = db.query(Measurement.id).first() is not None
+        if not has_rollups and has_measurements:
+            logger.info("Побудова погодинних агрегатів вимірювань з історичних даних")
+            rebuild_hourly(db)
+        else:
+            db.commit()
+    finally:
+        db.close()
+
+
+async def estimate_measurements(db: AsyncSession, time_from: datetime, time_to: datetime,
+                                room_id: Optional[int] = None) -> int:
+    # Кількість вимірювань у годинах, що перетинаються з діапазоном, - без читання сирих рядків
+    query = select(func.coalesce(func.sum(MeasurementHourly.count), 0)).where(
+        MeasurementHourly.hour >= hour_bucket(time_from), MeasurementHourly.hour <= time_to
+    )
+    if room_id:
+        query = query.join(Device, Device.id == MeasurementHourly.device_id).where(Device.room_id == room_id)
+    return (await db.execute(query)).scalar()
+
+
+async def get_hourly_rollups(db: AsyncSession, time_from: datetime, time_to: datetime,
+                             room_id: Optional[int] = None) -> pd.DataFrame:
+    hourly = MeasurementHourly.__table__
+    query = select(hourly).where(hourly.c.hour >= time_from, hourly.c.hour < time_to)
+    if room_id:
+        query = query.join(Device, Device.id == hourly.c.device_id).where(Device.room_id == room_id)
+    query = query.order_by(hourly.c.device_id, hourly.c.hour)
+
+    result = await db.execute(query)
+    return pd.DataFrame(result.all(), columns=list(result.keys()))
@@ -1,13 +1,19 @@
+from typing import Any, Dict, Optional
+
 from fastapi import HTTPException
+from sqlalchemy import func, select, true
 from sqlalchemy.orm import Session, joinedload
 
 from models.esp import Device
+from models.measurement_hourly import MeasurementHourly
 from models.room import Room
+from services import live_service
+from services.device_service import device_id_cache
+from services.statistics_cache import statistics_cache
 from sсhemas.device import DeviceRead
 from sсhemas.room import RoomCreate, RoomRead
 
 
-
 def create_room(db: Session, room: RoomCreate):
     existing_room = db.query(Room).filter(Room.name == room.name).first()
     if existing_room:
@@ -28,6 +34,8 @@ def create_room(db: Session, room: RoomCreate):
         device.room_id = db_room.id
 
     db.commit()
+    live_service.invalidate_rooms()
+    statistics_cache.clear()
     db.refresh(db_room)
 
     return db_room
@@ -36,8 +44,16 @@ def create_room(db: Session, room: RoomCreate):
 def delete_room(db: Session, room_id: int):
     db_room = db.query(Room).filter(Room.id == room_id).first()
     if db_room:
+        # Пристрої кімнати видаляються каскадно, тож їх MAC-адреси треба прибрати з кешу
+        mac_addresses = [device.mac_address for device in db_room.devices]
+        device_ids = [device.id for device in db_room.devices]
         db.delete(db_room)
         db.commit()
+        for mac_address in mac_addresses:
+            device_id_cache.invalidate(mac_address)
+        live_service.forget_devices(device_ids)
+        live_service.invalidate_rooms()
+        statistics_cache.clear()
 
 
 def get_all_rooms(db: Session):
@@ -54,3 +70,24 @@ def get_room_devices(db: Session, room_id: int):
         joinedload(Device.configs)
     ).all()
     return [DeviceRead.from_orm(device) for device in devices]
+
+
+def get_room_summaries(db: Session, limit: int, after_id: Optional[int] = None) -> Dict[str, Any]:
+    totals = select(
+        func.count(func.distinct(Device.id)).label("device_count"),
+        func.coalesce(func.sum(MeasurementHourly.count), 0).label("measurement_count"),
+        func.max(MeasurementHourly.last_timestamp).label("last_seen")
+    ).select_from(Device).outerjoin(
+        MeasurementHourly, MeasurementHourly.device_id == Device.id
+    ).where(Device.room_id == Room.id).lateral("totals")
+
+    query = select(
+        Room.id, Room.name, totals.c.device_count, totals.c.measurement_count, totals.c.last_seen
+    ).select_from(Room).join(totals, true())
+    if after_id is not None:
+        query = query.where(Room.id > after_id)
+
+    rows = db.execute(query.order_by(Room.id).limit(limit + 1)).mappings().all()
+    has_more = len(rows) > limit
+    items = [dict(row) for row in rows[:limit]]
+    return {"items": items, "next_after_id": items[-1]["id"] if has_more else None}
@@ -0,0 +1,42 @@
+from datetime import datetime
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+from cache import VersionedCache
+from Constants import STATS_CACHE_SIZE, STATS_CACHE_OPEN_TTL_SECONDS
+
+
+class StatisticsCache(VersionedCache):
+    # Вікна, що повністю в минулому, зберігаються без TTL, доки їх не змінять запізнілі вимірювання
+    # або перерахунок продуктивності; вікна, що включають поточний момент, живуть open_ttl секунд
+    def __init__(self, maxsize: int = STATS_CACHE_SIZE, open_ttl: float = STATS_CACHE_OPEN_TTL_SECONDS):
+        super().__init__(maxsize)
+        self.open_ttl = open_ttl
+        # Найпізніший кінець закритого вікна, запитаного після останнього очищення
+        self._closed_until: Optional[datetime] = None
+
+    def reserve(self, key: Hashable, time_to: datetime) -> Tuple[Tuple[int, int], Optional[float]]:
+        # Версія береться до читання з БД: якщо поки рахується статистика прийдуть запізнілі
+        # вимірювання, clear() змінить епоху і set_if_current не збереже застарілий результат
+        closed = time_to < datetime.utcnow()
+        with self._lock:
+            if closed and (self._closed_until is None or time_to > self._closed_until):
+                self._closed_until = time_to
+            return (self._epoch, self._versions.get(key, 0)), None if closed else self.open_ttl
+
+    def record_measurements(self, rows: Iterable[Dict[str, Any]]) -> None:
+        # Вимірювання в реальному часі новіші за будь-яке закрите вікно й кеш не зачіпають
+        with self._lock:
+            closed_until = self._closed_until
+        if closed_until is not None and any(row["timestamp"] <= closed_until for row in rows):
+            self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._epoch += 1
+            self._versions.clear()
+            self._data.clear()
+            self._expires.clear()
+            self._closed_until = None
+
+
+statistics_cache = StatisticsCache()
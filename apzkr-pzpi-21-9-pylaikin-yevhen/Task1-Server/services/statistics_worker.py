@@ -0,0 +1,248 @@
+import math
+from typing import Dict, List, Optional, Tuple, Any
+
+import pandas as pd
+
+from services.quantile_sketch import merge_sketches, sketch_quantiles
+
+# Модуль не залежить від БД, тому його можна імпортувати в дочірніх процесах пулу статистики.
+# NaN і numpy-скаляри залишаються як є: їх перетворює JSON-відповідь на основі orjson
+
+
+def calculate_parameter_stats(series: pd.Series) -> Dict:
+    try:
+        return {
+            'mean': series.mean(),
+            'std': series.std(),
+            'min': series.min(),
+            'max': series.max(),
+            **calculate_distribution_stats(series)
+        }
+    except Exception as e:
+        print(f"Помилка при розрахунку статистичних параметрів: {str(e)}")
+        return {}
+
+
+def calculate_distribution_stats(series: pd.Series) -> Dict:
+    return {
+        **calculate_quantile_stats(series),
+        'skewness': series.skew(),
+        'kurtosis': series.kurtosis()
+    }
+
+
+def calculate_quantile_stats(series: pd.Series) -> Dict:
+    return {
+        'median': series.median(),
+        'quartiles': series.quantile([0.25, 0.5, 0.75]).tolist(),
+        'iqr': series.quantile(0.75) - series.quantile(0.25)
+    }
+
+
+def calculate_sketch_quantile_stats(hourly_df: pd.DataFrame, channel: str) -> Dict:
+    # Наближені значення з похибкою, описаною в services/quantile_sketch.py
+    counts = hourly_df['productivity_count' if channel == 'productivity' else 'count']
+    sketch = merge_sketches(hourly_df.loc[counts > 0, f'{channel}_sketch'])
+    quartiles = sketch_quantiles(sketch, [0.25, 0.5, 0.75])
+    return {
+        'median': quartiles[1],
+        'quartiles': quartiles,
+        'iqr': quartiles[2] - quartiles[0]
+    }
+
+
+def _zero_out_fperr(value: float) -> float:
+    # Той самий поріг похибки округлення, що й у pandas nanops
+    return 0.0 if abs(value) < 1e-14 else value
+
+
+def merge_bucket_moments(hourly_df: pd.DataFrame, channel: str) -> Tuple[float, float, float, float, float]:
+    # Об'єднання погодинних моментів (Chan/Pébay) у моменти всього діапазону:
+    # відхилення середніх годин від загального середнього додаються до сум кожної години
+    counts = hourly_df['productivity_count' if channel == 'productivity' else 'count'].astype(float)
+    buckets = hourly_df[counts > 0]
+    counts = counts[counts > 0]
+    count = counts.sum()
+    if not count:
+        return 0.0, math.nan, math.nan, math.nan, math.nan
+
+    means = buckets[f'{channel}_mean'].astype(float)
+    m2, m3, m4 = (buckets[f'{channel}_{moment}'].astype(float) for moment in ('m2', 'm3', 'm4'))
+    mean = (counts * means).sum() / count
+    delta = means - mean
+    return (
+        count,
+        mean,
+        (m2 + counts * delta ** 2).sum(),
+        (m3 + 3 * delta * m2 + counts * delta ** 3).sum(),
+        (m4 + 4 * delta * m3 + 6 * delta ** 2 * m2 + counts * delta ** 4).sum()
+    )
+
+
+def moment_skewness(count: float, m2: float, m3: float) -> float:
+    # Скоригована вибіркова асиметрія G1, як у pandas Series.skew()
+    if count < 3 or math.isnan(m2) or math.isnan(m3):
+        return math.nan
+    m2, m3 = _zero_out_fperr(m2), _zero_out_fperr(m3)
+    if m2 == 0:
+        return 0.0
+    return count * (count - 1) ** 0.5 / (count - 2) * (m3 / m2 ** 1.5)
+
+
+def moment_kurtosis(count: float, m2: float, m4: float) -> float:
+    # Скоригований вибірковий ексцес G2 (Фішера), як у pandas Series.kurtosis()
+    if count < 4 or math.isnan(m2) or math.isnan(m4):
+        return math.nan
+    numerator = _zero_out_fperr(count * (count + 1) * (count - 1) * m4)
+    denominator = _zero_out_fperr((count - 2) * (count - 3) * m2 ** 2)
+    if denominator == 0:
+        return 0.0
+    return numerator / denominator - 3 * (count - 1) ** 2 / ((count - 2) * (count - 3))
+
+
+def calculate_rollup_parameter_stats(hourly_df: pd.DataFrame, channel: str) -> Dict:
+    try:
+        count, mean, m2, m3, m4 = merge_bucket_moments(hourly_df, channel)
+        stats = {
+            'mean': mean,
+            # Вибіркове стандартне відхилення (ddof=1), як у pandas Series.std()
+            'std': math.sqrt(m2 / (count - 1)) if count > 1 else math.nan,
+            'min': hourly_df[f'{channel}_min'].min(),
+            'max': hourly_df[f'{channel}_max'].max()
+        }
+        stats.update(calculate_sketch_quantile_stats(hourly_df, channel))
+        stats['skewness'] = moment_skewness(count, m2, m3)
+        stats['kurtosis'] = moment_kurtosis(count, m2, m4)
+        return stats
+    except Exception as e:
+        print(f"Помилка при розрахунку статистичних параметрів: {str(e)}")
+        return {}
+
+
+def calculate_aggregate_parameter_stats(aggregates: Dict[str, Any], channel: str) -> Dict:
+    # Агрегати каналу, пораховані в Postgres; NULL (порожній канал) стає NaN, як у pandas
+    try:
+        count = aggregates[f'{channel}_count']
+        quartiles = aggregates[f'{channel}_quartiles'] or [math.nan] * 3
+        m2, m3, m4 = (aggregates[f'{channel}_{moment}'] for moment in ('m2', 'm3', 'm4'))
+        m2, m3, m4 = (math.nan if value is None else value for value in (m2, m3, m4))
+        return {
+            'mean': aggregates[f'{channel}_mean'],
+            'std': aggregates[f'{channel}_std'] if aggregates[f'{channel}_std'] is not None else math.nan,
+            'min': aggregates[f'{channel}_min'],
+            'max': aggregates[f'{channel}_max'],
+            'median': quartiles[1],
+            'quartiles': list(quartiles),
+            'iqr': quartiles[2] - quartiles[0],
+            'skewness': moment_skewness(count, m2, m3),
+            'kurtosis': moment_kurtosis(count, m2, m4)
+        }
+    except Exception as e:
+        print(f"Помилка при розрахунку статистичних параметрів: {str(e)}")
+        return {}
+
+
+def calculate_time_stats(df: pd.DataFrame) -> Dict:
+    try:
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        df = df.set_index('timestamp')
+        hourly_means = df.resample('h').mean()
+
+        hourly_trends = {
+            'temperature': hourly_means['temperature'].tolist(),
+            'humidity': hourly_means['humidity'].tolist(),
+            'co2': hourly_means['co2'].tolist(),
+            'productivity': hourly_means['productivity'].tolist() if 'productivity' in hourly_means.columns else None
+        }
+
+        return {
+            'start_time': df.index.min().isoformat(),
+            'end_time': df.index.max().isoformat(),
+            'duration': (df.index.max() - df.index.min()).total_seconds() / 3600,
+            'hourly_trends': {k: values for k, values in hourly_trends.items() if values is not None}
+        }
+    except Exception as e:
+        print(f"Помилка при розрахунку даних часового ряду: {str(e)}")
+        return {}
+
+
+def calculate_rollup_time_stats(hourly_df: pd.DataFrame) -> Dict:
+    try:
+        start_time = pd.Timestamp(hourly_df['first_timestamp'].min())
+        end_time = pd.Timestamp(hourly_df['last_timestamp'].max())
+        # Ті самі погодинні точки, що й resample('h') по сирих даних: години без даних стають None
+        hours = pd.date_range(hourly_df['hour'].min(), hourly_df['hour'].max(), freq='h')
+        hourly = hourly_df.set_index('hour').reindex(hours)
+
+        hourly_trends = {}
+        for channel in ('temperature', 'humidity', 'co2', 'productivity'):
+            count = hourly['productivity_count' if channel == 'productivity' else 'count']
+            hourly_trends[channel] = (hourly[f'{channel}_sum'] / count).tolist()
+
+        return {
+            'start_time': start_time.isoformat(),
+            'end_time': end_time.isoformat(),
+            'duration': (end_time - start_time).total_seconds() / 3600,
+            'hourly_trends': hourly_trends
+        }
+    except Exception as e:
+        print(f"Помилка при розрахунку даних часового ряду: {str(e)}")
+        return {}
+
+
+def compute_device_statistics(device_id: int, device_df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+    try:
+        return {
+            'device_id': f'device_{device_id}',
+            'temperature': calculate_parameter_stats(device_df['temperature']),
+            'humidity': calculate_parameter_stats(device_df['humidity']),
+            'co2': calculate_parameter_stats(device_df['co2']),
+            'productivity': calculate_parameter_stats(device_df['productivity']),
+            'time_stats': calculate_time_stats(device_df)
+        }
+    except Exception as e:
+        print(f"Помилка при розрахунку статистики для девайсу з  {device_id}: {str(e)}")
+        return None
+
+
+def compute_devices_statistics(groups: List[Tuple[int, pd.DataFrame]]) -> List[Dict[str, Any]]:
+    device_stats = []
+    for device_id, device_df in groups:
+        stats = compute_device_statistics(device_id, device_df)
+        if stats is not None:
+            device_stats.append(stats)
+    return device_stats
+
+
+def compute_device_aggregate_statistics(device_id: int, aggregates: Dict[str, Any],
+                                        hourly_df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+    try:
+        stats = {'device_id': f'device_{device_id}'}
+        for channel in ('temperature', 'humidity', 'co2', 'productivity'):
+            stats[channel] = calculate_aggregate_parameter_stats(aggregates, channel)
+        stats['time_stats'] = calculate_rollup_time_stats(hourly_df)
+        return stats
+    except Exception as e:
+        print(f"Помилка при розрахунку статистики для девайсу з  {device_id}: {str(e)}")
+        return None
+
+
+def compute_device_rollup_statistics(device_id: int, hourly_df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+    try:
+        stats = {'device_id': f'device_{device_id}'}
+        for channel in ('temperature', 'humidity', 'co2', 'productivity'):
+            stats[channel] = calculate_rollup_parameter_stats(hourly_df, channel)
+        stats['time_stats'] = calculate_rollup_time_stats(hourly_df)
+        return stats
+    except Exception as e:
+        print(f"Помилка при розрахунку статистики для девайсу з  {device_id}: {str(e)}")
+        return None
+
+
+def compute_devices_rollup_statistics(groups: List[Tuple[int, pd.DataFrame]]) -> List[Dict[str, Any]]:
+    device_stats = []
+    for device_id, hourly_df in groups:
+        stats = compute_device_rollup_statistics(device_id, hourly_df)
+        if stats is not None:
+            device_stats.append(stats)
+    return device_stats
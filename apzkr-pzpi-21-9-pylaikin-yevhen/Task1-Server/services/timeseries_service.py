@@ -0,0 +1,180 @@
+import math
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import Float, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from Constants import TIMESERIES_LTTB_MAX_ROWS
+from models.esp import Device
+from models.measurement import Measurement
+from models.measurement_hourly import MeasurementHourly
+from services import rollup_service
+
+CHANNELS = rollup_service.CHANNELS
+BUCKET_UNITS = (("minute", 60), ("hour", 3600), ("day", 86400))
+EPOCH = datetime(1970, 1, 1)
+
+
+def choose_bucket(time_from: datetime, time_to: datetime, max_points: int) -> Tuple[str, int]:
+    # Кошики вирівняні по епосі, тож діапазон перетинає не більше ceil(span / width) + 1 з них
+    span = (time_to - time_from).total_seconds()
+    for name, seconds in BUCKET_UNITS:
+        if math.ceil(span / seconds) + 1 <= max_points:
+            return name, seconds
+    days = math.ceil(span / 86400 / (max_points - 1))
+    return "day", days * 86400
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    # Largest-Triangle-Three-Buckets: перша й остання точки залишаються, з кожного кошика між ними
+    # береться точка, що утворює найбільший трикутник з попередньою вибраною і середнім наступного кошика
+    size = len(x)
+    if threshold >= size or threshold < 3:
+        return np.arange(size)
+
+    edges = np.floor(np.linspace(1, size - 1, threshold - 1)).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = size - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else size
+        next_x = x[next_start:next_end].mean() if next_end > next_start else x[-1]
+        next_y = y[next_start:next_end].mean() if next_end > next_start else y[-1]
+
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        selected[bucket + 1] = previous
+    return selected
+
+
+async def get_target_devices(db: AsyncSession, room_id: Optional[int],
+                             mac_address: Optional[str]) -> Dict[int, str]:
+    query = select(Device.id, Device.mac_address).order_by(Device.id)
+    if room_id is not None:
+        query = query.where(Device.room_id == room_id)
+    if mac_address is not None:
+        query = query.where(Device.mac_address == mac_address)
+    devices = dict((await db.execute(query)).all())
+    if not devices:
+        raise ValueError("Пристроїв для побудови часового ряду не знайдено")
+    return devices
+
+
+async def estimate_device_measurements(db: AsyncSession, device_ids: List[int], time_from: datetime,
+                                       time_to: datetime) -> Dict[int, int]:
+    result = await db.execute(
+        select(MeasurementHourly.device_id, func.sum(MeasurementHourly.count))
+        .where(MeasurementHourly.device_id.in_(device_ids),
+               MeasurementHourly.hour >= rollup_service.hour_bucket(time_from),
+               MeasurementHourly.hour <= time_to)
+        .group_by(MeasurementHourly.device_id)
+    )
+    return dict(result.all())
+
+
+async def get_raw_readings(db: AsyncSession, device_ids: List[int], time_from: datetime,
+                           time_to: datetime) -> Dict[int, List[Any]]:
+    result = await db.execute(
+        select(Measurement.device_id, Measurement.timestamp, *[getattr(Measurement, channel) for channel in CHANNELS])
+        .where(Measurement.device_id.in_(device_ids), Measurement.timestamp.between(time_from, time_to))
+        .order_by(Measurement.device_id, Measurement.timestamp)
+    )
+    readings = {device_id: [] for device_id in device_ids}
+    for row in result.all():
+        readings[row[0]].append(row[1:])
+    return readings
+
+
+async def get_bucket_means(db: AsyncSession, device_ids: List[int], time_from: datetime, time_to: datetime,
+                           bucket_seconds: int) -> Dict[int, List[Any]]:
+    if bucket_seconds < 3600:
+        # Хвилинні кошики рахуються з сирих вимірювань
+        bucket = func.floor(func.extract('epoch', Measurement.timestamp) / bucket_seconds)
+        query = select(
+            Measurement.device_id, bucket.label("bucket"),
+            *[func.avg(cast(getattr(Measurement, channel), Float)) for channel in CHANNELS]
+        ).where(Measurement.device_id.in_(device_ids), Measurement.timestamp.between(time_from, time_to))
+        device_column = Measurement.device_id
+    else:
+        # Годинні й довші кошики складаються з measurement_hourly: вартість не залежить від кількості
+        # вимірювань, а крайні години діапазону входять у кошик цілком
+        hourly = MeasurementHourly
+        bucket = func.floor(func.extract('epoch', hourly.hour) / bucket_seconds)
+        query = select(
+            hourly.device_id, bucket.label("bucket"),
+            *[func.sum(getattr(hourly, f"{channel}_sum"))
+              / func.nullif(func.sum(getattr(hourly, rollup_service.count_column(channel))), 0)
+              for channel in CHANNELS]
+        ).where(hourly.device_id.in_(device_ids), hourly.hour >= rollup_service.hour_bucket(time_from),
+                hourly.hour <= time_to)
+        device_column = hourly.device_id
+
+    result = await db.execute(query.group_by(device_column, bucket).order_by(device_column, bucket))
+    buckets = {device_id: [] for device_id in device_ids}
+    for device_id, index, *means in result.all():
+        buckets[device_id].append((EPOCH + timedelta(seconds=int(index) * bucket_seconds), *means))
+    return buckets
+
+
+def build_series(rows: List[Any]) -> Dict[str, Dict[str, list]]:
+    timestamps = [row[0] for row in rows]
+    return {
+        channel: {"timestamps": timestamps, "values": [row[position + 1] for row in rows]}
+        for position, channel in enumerate(CHANNELS)
+    }
+
+
+def build_lttb_series(rows: List[Any], max_points: int) -> Dict[str, Dict[str, list]]:
+    series = {}
+    for position, channel in enumerate(CHANNELS):
+        points = [(row[0], row[position + 1]) for row in rows if row[position + 1] is not None]
+        if not points:
+            series[channel] = {"timestamps": [], "values": []}
+            continue
+        x = np.array([(timestamp - EPOCH).total_seconds() for timestamp, _ in points])
+        y = np.array([value for _, value in points], dtype=np.float64)
+        selected = lttb(x, y, max_points)
+        series[channel] = {
+            "timestamps": [points[index][0] for index in selected],
+            "values": [points[index][1] for index in selected]
+        }
+    return series
+
+
+async def get_time_series(db: AsyncSession, time_from: datetime, time_to: datetime, room_id: Optional[int] = None,
+                          mac_address: Optional[str] = None, max_points: int = 500, mode: str = "auto",
+                          lttb_max_rows: int = TIMESERIES_LTTB_MAX_ROWS) -> List[Dict[str, Any]]:
+    if time_to < time_from:
+        raise ValueError("time_to не може бути раніше time_from")
+
+    devices = await get_target_devices(db, room_id, mac_address)
+    estimates = await estimate_device_measurements(db, list(devices), time_from, time_to)
+
+    # Пристрої, чиї сирі вимірювання вміщуються в бюджет, повертаються без агрегації. LTTB вибирає точки
+    # із сирих вимірювань, тож для нього бюджет читання - lttb_max_rows на пристрій; довші ряди
+    # усереднюються по кошиках, як у режимі auto
+    raw_limit = lttb_max_rows if mode == "lttb" else max_points
+    raw_ids = [device_id for device_id in devices if estimates.get(device_id, 0) <= raw_limit]
+    bucket_ids = [device_id for device_id in devices if device_id not in raw_ids]
+    raw = await get_raw_readings(db, raw_ids, time_from, time_to) if raw_ids else {}
+    resolution, bucket_seconds = choose_bucket(time_from, time_to, max_points)
+    buckets = await get_bucket_means(db, bucket_ids, time_from, time_to, bucket_seconds) if bucket_ids else {}
+
+    device_series = []
+    for device_id, mac in devices.items():
+        entry = {"device_id": f"device_{device_id}", "mac_address": mac}
+        if device_id in buckets:
+            entry.update(resolution=resolution, bucket_seconds=bucket_seconds, series=build_series(buckets[device_id]))
+        elif len(raw[device_id]) > max_points:
+            entry.update(resolution="lttb", series=build_lttb_series(raw[device_id], max_points))
+        else:
+            entry.update(resolution="raw", series=build_series(raw[device_id]))
+        device_series.append(entry)
+    return device_series
@@ -1,31 +1,35 @@
 from datetime import timedelta
 from fastapi import HTTPException, status
 
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from models.user import User
 
-from auth import authenticate_user, get_password_hash, verify_password, create_access_token
+from auth import authenticate_user_async, hash_password, verify_and_update_password, create_access_token, \
+    invalidate_user
+from sсhemas.user import UserRead
 
 from Constants import ACCESS_TOKEN_EXPIRE_MINUTES
 
 
-def register_user(db: Session, username: str, password: str, role: str = "manager"):
-    existing_user = db.query(User).filter(User.username == username).first()
+async def register_user(db: AsyncSession, username: str, password: str, role: str = "manager"):
+    existing_user = (await db.execute(select(User.id).where(User.username == username))).first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Користувач з таким ім'ям вже існує")
 
-    hashed_password = get_password_hash(password)
+    hashed_password = await hash_password(password)
     new_user = User(username=username, password_hash=hashed_password, role=role)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     return new_user
 
 
-def login(db: Session, username: str, password: str):
-    user = authenticate_user(db, username, password)
+async def login(db: AsyncSession, username: str, password: str):
+    user = await authenticate_user_async(db, username, password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -39,12 +43,18 @@ def login(db: Session, username: str, password: str):
     return {"access_token": access_token, "token_type": "bearer"}
 
 
-def change_password(db: Session, user: User, old_password: str, new_password: str):
-    if not verify_password(old_password, user.password_hash):
+async def change_password(db: AsyncSession, current_user: UserRead, old_password: str, new_password: str):
+    # Поточний користувач береться з кешу авторизації, тож хеш пароля читаємо з БД
+    user = (await db.execute(select(User).where(User.id == current_user.id))).scalar_one_or_none()
+    if not user:
+        raise HTTPException(status_code=404, detail="Користувача не знайдено")
+    valid, _ = await verify_and_update_password(old_password, user.password_hash)
+    if not valid:
         raise HTTPException(status_code=400, detail="Не вірний старий пароль")
 
-    user.password_hash = get_password_hash(new_password)
-    db.commit()
+    user.password_hash = await hash_password(new_password)
+    await db.commit()
+    invalidate_user(user.username)
 
 
 def ban_user(db: Session, username: str):
@@ -53,6 +63,7 @@ def ban_user(db: Session, username: str):
         raise HTTPException(status_code=404, detail="Користувача не знайдено")
     user.is_banned = True
     db.commit()
+    invalidate_user(username)
 
 
 def unban_user(db: Session, username: str):
@@ -61,6 +72,7 @@ def unban_user(db: Session, username: str):
         raise HTTPException(status_code=404, detail="Користувача не знайдено")
     user.is_banned = False
     db.commit()
+    invalidate_user(username)
 
 
 def change_role(db: Session, username: str, role: str):
@@ -72,6 +84,7 @@ def change_role(db: Session, username: str, role: str):
     if user.role == 'manager' and role == 'admin':
         user.role = role
         db.commit()
+        invalidate_user(username)
     elif user.role == 'admin' and role == 'manager':
         raise HTTPException(status_code=400, detail="Неможливо понизити адміністратора до менеджера")
     else:
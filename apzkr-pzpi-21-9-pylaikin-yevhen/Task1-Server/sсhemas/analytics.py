@@ -1,7 +1,9 @@
-from pydantic import BaseModel
-from datetime import datetime
+from pydantic import BaseModel, Field, validator
+from datetime import datetime, timezone
 from typing import Optional, List, Dict
 
+from Constants import PREDICT_BATCH_MAX_READINGS
+
 
 class PredictionInput(BaseModel):
     mac_address: str
@@ -10,6 +12,10 @@ class PredictionInput(BaseModel):
     CO2: float
 
 
+class PredictionBatchInput(BaseModel):
+    readings: List[PredictionInput] = Field(..., min_length=1, max_length=PREDICT_BATCH_MAX_READINGS)
+
+
 class ParameterStats(BaseModel):
     mean: Optional[float] = None
     median: Optional[float] = None
@@ -38,10 +44,23 @@ class StatisticsOutput(BaseModel):
     time_stats: Optional[TimeStats] = None
 
 
-class StatisticsInput(BaseModel):
+class TimeRangeInput(BaseModel):
     time_from: datetime
     time_to: datetime
 
+    @validator('time_from', 'time_to')
+    def to_naive_utc(cls, v):
+        # Вимірювання зберігаються як naive UTC (datetime.utcnow), asyncpg не приводить aware-значення сам
+        if v.tzinfo is not None:
+            v = v.astimezone(timezone.utc).replace(tzinfo=None)
+        return v
+
+
+class StatisticsInput(TimeRangeInput):
+    # Медіана й квартилі за замовчуванням беруться з квантильних скетчів (відносна похибка до 0.5%);
+    # exact=True рахує їх по сирих вимірюваннях
+    exact: bool = False
+
 
 class RoomStatisticsInput(StatisticsInput):
     room_id: int
@@ -49,3 +68,35 @@ class RoomStatisticsInput(StatisticsInput):
 
 class StatisticsResponse(BaseModel):
     statistics: List[StatisticsOutput]
+
+
+class TimeSeriesInput(TimeRangeInput):
+    room_id: Optional[int] = None
+    mac_address: Optional[str] = None
+    # Максимум точок на канал пристрою незалежно від довжини діапазону
+    max_points: int = Field(500, ge=10, le=10000)
+    mode: str = Field("auto", pattern="^(auto|lttb)$")
+
+    @validator('mac_address', always=True)
+    def require_target(cls, v, values):
+        if v is None and values.get('room_id') is None:
+            raise ValueError('Потрібно вказати room_id або mac_address')
+        return v
+
+
+class ChannelSeries(BaseModel):
+    timestamps: List[datetime] = []
+    values: List[Optional[float]] = []
+
+
+class DeviceTimeSeries(BaseModel):
+    device_id: str
+    mac_address: str
+    # raw - сирі вимірювання, lttb - вибрані з них точки, minute/hour/day - середні за кошик
+    resolution: str
+    bucket_seconds: Optional[int] = None
+    series: Dict[str, ChannelSeries]
+
+
+class TimeSeriesResponse(BaseModel):
+    series: List[DeviceTimeSeries]
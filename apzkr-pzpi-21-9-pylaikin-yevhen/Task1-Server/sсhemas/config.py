@@ -1,5 +1,3 @@
-import json
-
 from pydantic import BaseModel, Field
 from typing import Optional, Union
 
@@ -32,13 +30,6 @@ class ConfigExport(ConfigImport):
     device_id: Union[int, str]
 
 
-class CustomJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, BaseModel):
-            return obj.dict()
-        return super().default(obj)
-
-
 class ConfigUpdate(BaseModel):
     ideal_values: Optional[SensorValues] = None
     min_values: Optional[SensorValues] = None
@@ -35,6 +35,38 @@ class DeviceRead(BaseModel):
         from_attributes = True
 
 
+class LatestReading(BaseModel):
+    timestamp: datetime
+    temperature: float
+    humidity: float
+    co2: float
+    productivity: Optional[int] = None
+
+
+class DeviceSummary(BaseModel):
+    id: int
+    mac_address: str
+    room_id: Optional[int] = None
+    measurement_count: int = 0
+    last_seen: Optional[datetime] = None
+    latest: Optional[LatestReading] = None
+
+
+class DeviceSummaryPage(BaseModel):
+    items: List[DeviceSummary] = []
+    next_after_id: Optional[int] = None
+
+
+class DeviceMeasurement(MeasurementRead):
+    productivity: Optional[int] = None
+
+
+class DeviceMeasurementPage(BaseModel):
+    items: List[DeviceMeasurement] = []
+    next_before_timestamp: Optional[datetime] = None
+    next_before_id: Optional[int] = None
+
+
 class DeviceCreate(BaseModel):
     mac_address: str
 
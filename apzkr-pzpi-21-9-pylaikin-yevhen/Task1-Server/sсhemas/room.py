@@ -1,4 +1,5 @@
-from typing import List, Union
+from datetime import datetime
+from typing import List, Optional, Union
 
 from pydantic import BaseModel, field_validator, validator
 import re
@@ -32,3 +33,16 @@ class RoomRead(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class RoomSummary(BaseModel):
+    id: int
+    name: str
+    device_count: int = 0
+    measurement_count: int = 0
+    last_seen: Optional[datetime] = None
+
+
+class RoomSummaryPage(BaseModel):
+    items: List[RoomSummary] = []
+    next_after_id: Optional[int] = None